@@ -0,0 +1,106 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from parsers import parseRom, parseSave
+from parsers.rom import readRom
+from parsers.save import getSaveInfo, getCurrentSave, process
+from structures.saves import offsets_dict
+import export
+from . import synthetic
+
+# Times the parsers on synthetic roms and saves of several sizes, and reports the results as JSON.
+# Usage: python -m benchmarks.run [--sizes small,medium] [--repeat 5] [--output results.json]
+
+sizes = {
+    'small':  {'species': 500,  'moves': 500,  'items': 846,  'abilities': 300, 'boxed': 30},
+    'medium': {'species': 1500, 'moves': 900,  'items': 846,  'abilities': 310, 'boxed': 200},
+    'large':  {'species': 3000, 'moves': 2000, 'items': 846,  'abilities': 600, 'boxed': 420},
+}
+
+def timeit(function, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+    }
+
+def runSize(name: str, counts: dict, repeat: int, workdir: str) -> list:
+    rom_path = os.path.join(workdir, f"{name}.gba")
+    save_path = os.path.join(workdir, f"{name}.sav")
+    cache_dir = os.path.join(workdir, f"{name}_cache")
+    with open(rom_path, 'wb') as f:
+        f.write(synthetic.buildRom(counts['species'], counts['moves'], counts['items'], counts['abilities']))
+    with open(save_path, 'wb') as f:
+        f.write(synthetic.buildSave(counts, boxed=counts['boxed']))
+
+    offsets = offsets_dict["expansion"]["1.8.0"]
+    with open(rom_path, 'rb') as f:
+        rom_data = f.read()
+    with open(save_path, 'rb') as f:
+        save_data = f.read()
+    rom = parseRom(rom_path)
+    parseRom(rom_path, cache_dir=cache_dir) # Creates the snapshot
+    slot_a = save_data[offsets["save_a"][0]:offsets["save_a"][1]]
+    slot_b = save_data[offsets["save_b"][0]:offsets["save_b"][1]]
+    savedata = getCurrentSave(getSaveInfo(slot_a), getSaveInfo(slot_b))
+    team = process(savedata, "expansion", rom)['team']
+    team_path = os.path.join(workdir, f"{name}_team.txt")
+
+    benchmarks = {
+        'parseRom': lambda: parseRom(rom_path),
+        'parseRom.lazy': lambda: parseRom(rom_path, lazy=True),
+        'parseRom.cached': lambda: parseRom(rom_path, cache_dir=cache_dir),
+        'readRom': lambda: readRom(rom_data),
+        'getSaveInfo': lambda: (getSaveInfo(slot_a), getSaveInfo(slot_b)),
+        'process': lambda: process(savedata, "expansion", rom),
+        'parseSave': lambda: parseSave(save_path, "expansion", rom),
+        'teamToCompetitive': lambda: export.teamToCompetitive(team, team_path),
+    }
+
+    results = []
+    for benchmark, function in benchmarks.items():
+        with redirect_stdout(io.StringIO()):
+            result = timeit(function, repeat)
+        results.append({'size': name, 'benchmark': benchmark, **counts, **result})
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the rom and save parsers on synthetic data")
+    parser.add_argument('--sizes', default=','.join(sizes), help="comma separated sizes to run, among " + ', '.join(sizes))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="file to write the JSON results to, instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.sizes.split(','):
+            results += runSize(name, sizes[name], args.repeat, workdir)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == '__main__':
+    main()
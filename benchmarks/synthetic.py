@@ -0,0 +1,164 @@
+import random
+import struct
+from parsers import charmap
+from parsers.checksum import pokemonChecksum, sectionChecksum, section_signature, footer_offset
+from parsers.pokemon import encryptSubstructs, experience_tables, box_pokemon_struct_size, pokemon_struct_size
+from parsers.versions.version_1_8_0 import layouts
+from structures.saves import offsets_dict, section_size, section_data_size, section_sizes, pc_sections
+
+# Builders for synthetic roms and saves, so that the parsers can be measured without a real rom or save.
+# The data is random but structurally valid: the rom has a RHH header pointing at well-formed tables,
+# and saves have valid footers and checksums, and encrypted party and box pokemon.
+
+rom_pointer_base = 0x8000000
+tables_offset = 0x100000
+vanilla_save_block_sizes = (3884, 15752) # SaveBlock2, SaveBlock1
+
+def randomName(rng: random.Random, prefix: str, length: int) -> str:
+    suffix = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(max(0, length - len(prefix) - 3)))
+    return (prefix + suffix)[:length]
+
+def headerFields(pointers: dict, counts: dict) -> dict:
+    # The header fields readRomHeader needs, every other field is left zeroed
+    return {
+        'moveNames': rom_pointer_base + pointers['moveNames'],
+        # Where vanilla emerald keeps its flags, vars and pokedex
+        'flagsOffset': 0x1270,
+        'varsOffset': 0x139C,
+        'pokedexOffset': 0x18,
+        'seen1Offset': 0x988,
+        'seen2Offset': 0x3B24,
+        'pokedexCount': 386,
+        'bagCountItems': 30,
+        'bagCountKeyItems': 30,
+        'bagCountPokeballs': 16,
+        'bagCountTMHMs': 64,
+        'bagCountBerries': 46,
+        'pcItemsCount': 50,
+        'pcItemsOffset': 0x498,
+        'pokemonNameLength1': 10,
+        'saveBlock2Size': vanilla_save_block_sizes[0],
+        'saveBlock1Size': vanilla_save_block_sizes[1],
+        'speciesInfo': rom_pointer_base + pointers['speciesInfo'],
+        'items': rom_pointer_base + pointers['items'],
+        'moves': rom_pointer_base + pointers['moves'],
+        'rhh_magic': b'RHHEXP',
+        'expansionVersionMajor': 1,
+        'expansionVersionMinor': 8,
+        'expansionVersionPatch': 0,
+        'movesCount': counts['moves'],
+        'numSpecies': counts['species'],
+        'abilitiesCount': counts['abilities'],
+        'abilities': rom_pointer_base + pointers['abilities'],
+    }
+
+def buildRom(species: int = 1500, moves: int = 900, items: int = 846, abilities: int = 310, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    item_stride = layouts.item.size
+    ability_stride = layouts.ability.size
+    species_stride = layouts.species_info.size
+    move_name_length = layouts.move_name.size
+    move_stride = layouts.battle_move.size
+    pointers = {'speciesInfo': tables_offset}
+    pointers['moveNames'] = pointers['speciesInfo'] + species_stride * species
+    pointers['items'] = pointers['moveNames'] + move_name_length * moves
+    pointers['abilities'] = pointers['items'] + item_stride * items
+    pointers['moves'] = pointers['abilities'] + ability_stride * abilities
+    end = pointers['moves'] + move_stride * moves
+
+    rom = bytearray(end)
+    rom[:layouts.rom_header.size] = layouts.rom_header.pack(**headerFields(pointers, {'species': species, 'moves': moves, 'abilities': abilities}))
+
+    for i in range(species):
+        record = bytearray(species_stride)
+        record[0:6] = bytes(rng.randint(5, 255) for _ in range(6))
+        record[6], record[7] = rng.randrange(19), rng.randrange(19)
+        record[18] = rng.choice((0, 31, 63, 127, 191, 254, 255))
+        record[20] = rng.choice((0, 35, 50, 70, 100, 140))
+        record[21] = rng.randrange(len(experience_tables))
+        struct.pack_into('<HHH', record, 24, rng.randrange(abilities), rng.randrange(abilities), rng.randrange(abilities))
+        record[31:44] = charmap.encode(randomName(rng, 'Cat', 8), 13)
+        record[44:55] = charmap.encode(randomName(rng, 'Mon', 10), 11)
+        struct.pack_into('<H', record, 56, i)
+        rom[pointers['speciesInfo'] + species_stride*i : pointers['speciesInfo'] + species_stride*(i+1)] = record
+
+    for i in range(moves):
+        offset = pointers['moveNames'] + move_name_length*i
+        rom[offset : offset + move_name_length] = charmap.encode(randomName(rng, 'Move', 12), move_name_length)
+        offset = pointers['moves'] + move_stride*i
+        struct.pack_into('<HBBBBB', rom, offset, rng.randrange(300), rng.randrange(250), rng.randrange(19), rng.randrange(101), rng.randrange(5, 41), rng.randrange(101))
+
+    for i in range(items):
+        offset = pointers['items'] + item_stride*i
+        struct.pack_into('<I', rom, offset, rng.randrange(10000))
+        rom[offset+19 : offset+32] = charmap.encode(randomName(rng, 'Item', 12), 13)
+
+    for i in range(abilities):
+        offset = pointers['abilities'] + ability_stride*i
+        rom[offset : offset+13] = charmap.encode(randomName(rng, 'Abil', 12), 13)
+
+    return bytes(rom)
+
+def buildPokemon(rng: random.Random, counts: dict, otId: int, party: bool) -> bytes:
+    personality = rng.getrandbits(32)
+    substructs = bytearray(48)
+    struct.pack_into('<HHI', substructs, 0, rng.randrange(1, counts['species']), rng.choice((0, rng.randrange(1, counts['items']))), rng.randrange(1, 1000000))
+    struct.pack_into('<HHHH', substructs, 12, *(rng.randrange(1, counts['moves']) for _ in range(4)))
+    substructs[24:30] = bytes(rng.randrange(256) for _ in range(6))
+    struct.pack_into('<I', substructs, 40, rng.getrandbits(31))
+
+    size = pokemon_struct_size if party else box_pokemon_struct_size
+    record = bytearray(size)
+    struct.pack_into('<II', record, 0, personality, otId)
+    record[8:18] = charmap.encode(randomName(rng, 'Nick', 10), 10)
+    record[18] = 2
+    record[19] = 0x02
+    struct.pack_into('<H', record, 28, pokemonChecksum(substructs))
+    record[32:80] = encryptSubstructs([(personality, otId, substructs)])[0]
+    if party:
+        record[84] = rng.randrange(1, 101)
+    return bytes(record)
+
+def buildSlot(rng: random.Random, counts: dict, index: int, party: int, boxed: int, trainer_id: int, game_version: str = "expansion", expansion_version: str = "1.8.0") -> bytearray:
+    offsets = offsets_dict[game_version][expansion_version]
+    sections = [bytearray(section_size) for _ in range(14)]
+
+    trainer = sections[0]
+    trainer[0:8] = charmap.encode(randomName(rng, 'P', 7), 8)
+    trainer[offsets["gender"]] = rng.randrange(2)
+    struct.pack_into('<I', trainer, offsets["trainer_id"][0], trainer_id)
+    struct.pack_into('<HBBB', trainer, 14, rng.randrange(1000), rng.randrange(60), rng.randrange(60), 0)
+    struct.pack_into('<I', trainer, offsets["security_key"][0], rng.getrandbits(32))
+
+    struct.pack_into('<I', sections[1], offsets["team_count"][0], party)
+    for i in range(party):
+        offset = offsets["team_offset"] + i*pokemon_struct_size
+        sections[1][offset : offset + pokemon_struct_size] = buildPokemon(rng, counts, trainer_id, True)
+
+    storage = bytearray(section_data_size * len(pc_sections))
+    box_slots = offsets["pc_box_count"] * offsets["pc_box_size"]
+    for slot in rng.sample(range(box_slots), min(boxed, box_slots)):
+        offset = offsets["pc_boxes_offset"] + slot*box_pokemon_struct_size
+        storage[offset : offset + box_pokemon_struct_size] = buildPokemon(rng, counts, trainer_id, False)
+    for box in range(offsets["pc_box_count"]):
+        offset = offsets["pc_box_names_offset"] + box*9
+        storage[offset : offset + 9] = charmap.encode(f"BOX{box + 1}", 9)
+    for k, section_id in enumerate(pc_sections):
+        sections[section_id][:section_data_size] = storage[k*section_data_size : (k+1)*section_data_size]
+
+    # Like the game, sections are rotated inside the slot depending on the save index
+    slot = bytearray()
+    for position in range(14):
+        section_id = (position + index) % 14
+        section = sections[section_id]
+        struct.pack_into('<HHII', section, footer_offset, section_id, sectionChecksum(section, section_sizes[section_id]), section_signature, index)
+        slot += section
+    return slot
+
+def buildSave(counts: dict, party: int = 6, boxed: int = 420, index: int = 10, seed: int = 0) -> bytes:
+    # counts are the table sizes of the rom the save is made for, the ids of the generated pokemon stay below them
+    rng = random.Random(seed)
+    trainer_id = rng.getrandbits(32)
+    slot_a = buildSlot(rng, counts, index, party, boxed, trainer_id)
+    slot_b = buildSlot(rng, counts, index - 1, party, boxed, trainer_id)
+    return bytes(slot_a + slot_b + bytes(131072 - len(slot_a) - len(slot_b)))
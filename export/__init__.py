@@ -1 +1 @@
-from .competitive import teamToCompetitive
+from .competitive import teamToCompetitive, pokemonToCompetitive, iterCompetitive, iterBoxes, iterSave, writeCompetitive
@@ -1,31 +1,60 @@
-import os
+# Exports pokemon in the Showdown (competitive) text format.
+# Each pokemon is formatted into a single string, and exports are generators of these strings, so they can be
+# written to any text stream (a file, sys.stdout, a socket...) or joined, without going through a temporary file.
+#
+#   with open('export.txt', 'w') as f:
+#       for save in saves:
+#           writeCompetitive(f, iterSave(save, boxes='all'))
 
-def teamToCompetitive(team: dict):
+def pokemonToCompetitive(pokemon) -> str:
+    if str.lower(pokemon['nickname']) == str.lower(pokemon['species']):
+        name = pokemon['nickname'] + " "
+    else:
+        name = pokemon['nickname'] + " (" + pokemon['species'] + ") "
+    item = '@ ' + pokemon['item'] if pokemon['item'] != 'NONE' else ''
+    ivs = pokemon['Ivs']
+    lines = [
+        name + pokemon['Gender'] + ' ' + item,
+        f"Ability: {pokemon['Ability']}",
+        f"Level: {pokemon['Level']}",
+        f"EVs: {pokemon['EvHp']} HP / {pokemon['EvAtk']} Atk / {pokemon['EvDef']} Def / {pokemon['EvSpA']} SpA / {pokemon['EvSpD']} SpD / {pokemon['EvSpe']} Spe",
+        f"{pokemon['Nature']} Nature",
+        f"IVs: {ivs['hp']} HP / {ivs['attack']} Atk / {ivs['defence']} Def / {ivs['spatk']} SpA / {ivs['spdef']} SpD / {ivs['speed']} Spe",
+    ]
+    lines += ["- " + move for move in pokemon['moves']]
+    return '\n'.join(lines) + "\n\n"
 
-    competitiveFilePath = 'CompetitiveTeam.txt'
+def iterCompetitive(pokemon: list):
+    # Empty slots (None) are skipped, so a box's pokemon can be given as is
+    for mon in pokemon:
+        if mon is not None:
+            yield pokemonToCompetitive(mon)
 
-    if os.path.exists(competitiveFilePath):
-        os.remove(competitiveFilePath)
+def iterBoxes(boxes: list, indexes=None):
+    # Yields a Showdown teambuilder header before each box, so that every box is imported as its own team.
+    # indexes selects the boxes to export, all of them by default. Empty boxes are left out.
+    for i in (range(len(boxes)) if indexes is None else indexes):
+        box = boxes[i]
+        if any(mon is not None for mon in box['pokemon']):
+            yield f"=== {box['name'] or f'Box {i + 1}'} ===\n\n"
+            yield from iterCompetitive(box['pokemon'])
 
-    with open(competitiveFilePath, 'w') as f:
-        for i in range (0, len(team)):
-            if str.lower(team[i]['nickname']) == str.lower(team[i]['species']):
-                f.write(team[i]['nickname'] + " ")
-            else:
-                f.write(team[i]['nickname'] + " (" + team[i]['species'] + ") " )
-            f.write(team[i]['Gender'] + ' ')
-            if team[i]['item'] != 'NONE':
-                f.write('@ ' + team[i]['item'])
-            f.write("\n")
-            f.write("Ability: " + str(team[i]['Ability']) + "\n")
-            f.write("Level: " + str(team[i]['Level']) + "\n")
-            f.write("EVs: " + str(team[i]['EvHp']) + " HP / " + str(team[i]['EvAtk']) + " Atk / " + str(team[i]['EvDef']) + " Def / ")
-            f.write(str(team[i]['EvSpA']) + " SpA / " + str(team[i]['EvSpD']) + " SpD / " + str(team[i]['EvSpe']) + " Spe\n")
-            f.write(team[i]['Nature'] + " Nature\n")
-            f.write("IVs: " + str(team[i]['Ivs']['hp']) + " HP / " + str(team[i]['Ivs']['attack']) + " Atk / " + str(team[i]['Ivs']['defence']) + " Def / ")
-            f.write(str(team[i]['Ivs']['spatk']) + " SpA / " + str(team[i]['Ivs']['spdef']) + " SpD / " + str(team[i]['Ivs']['speed']) + " Spe\n")
-            for move in team[i]['moves']:
-                f.write("- " + move + "\n")
-            f.write("\n")
+def iterSave(save: dict, party: bool = True, boxes=None):
+    # boxes is None for no box, 'all' for the whole storage, or a list of box indexes
+    if party:
+        yield from iterCompetitive(save['team'])
+    if boxes is not None:
+        yield from iterBoxes(save['boxes'], None if boxes == 'all' else boxes)
 
-        f.close()
+def writeCompetitive(stream, chunks) -> int:
+    # Writes the chunks of one of the generators above to stream, and returns the amount of characters written
+    written = 0
+    for chunk in chunks:
+        # Not every text stream returns the amount written (e.g. codecs writers return None)
+        stream.write(chunk)
+        written += len(chunk)
+    return written
+
+def teamToCompetitive(team: dict, path: str = 'CompetitiveTeam.txt'):
+    with open(path, 'w') as f:
+        writeCompetitive(f, iterCompetitive(team))
@@ -1,9 +1,20 @@
+import sys
 from parsers import parseSave, parseRom
 import export
 
-rom = parseRom('./pokeemerald.gba')
+rom = parseRom('./pokeemerald.gba', cache_dir='./.ese_cache')
+
+if "--watch" in sys.argv:
+    # Keeps the rom loaded and exports the team again each time the save is rewritten
+    from parsers.watch import SaveWatcher
+    for data, sections in SaveWatcher('./pokeemerald.sav', "expansion", rom).watch():
+        print(f"Save {data['index']} (slot {data['slot']}): sections {sections} changed")
+        if 1 in sections:
+            export.teamToCompetitive(data['team'])
+    sys.exit()
+
 data = parseSave('./pokeemerald.sav', "expansion", rom)
 
-print(f"Player: {data}")
+print(f"Player: {data['name']} ({data['gender']}), trainer ID {data['trainer_id']}, slot {data['slot']}")
 
 export.teamToCompetitive(data['team'])
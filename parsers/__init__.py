@@ -1,2 +1,3 @@
 from .save import parseSave
 from .rom import parseRom
+from .writer import writeSave
@@ -0,0 +1,94 @@
+import sys
+from array import array
+from .lookup import nameIndex
+from .progress import readSaveBlock1, saveBlock1Chunks
+from structures.records import ItemSlot
+
+# Reads and writes the bag pockets and the PC items, stored in SaveBlock1 as ItemSlots:
+#   struct ItemSlot { u16 itemId; u16 quantity; }
+# The header gives where the PC items start and how many slots each pocket has, the pockets following the PC
+# items in this order. Bag quantities are XORed with the low 16 bits of the save's security key, the PC ones aren't.
+# A pocket's slots are decrypted at once, by XORing the whole pocket as a single integer.
+#
+#   for slot in save["bag"]["balls"]:
+#       print(slot["name"], slot["quantity"])
+
+# (pocket, header field holding its amount of slots, whether its quantities are encrypted)
+pockets = (
+    ('pcItems',  'pcItemsCount',      False),
+    ('items',    'bagCountItems',     True),
+    ('keyItems', 'bagCountKeyItems',  True),
+    ('balls',    'bagCountPokeballs', True),
+    ('tmhm',     'bagCountTMHMs',     True),
+    ('berries',  'bagCountBerries',   True),
+)
+item_slot_size = 4
+
+def pocketBounds(header: dict) -> dict:
+    # The (offset in SaveBlock1, amount of slots, encrypted) of each pocket
+    bounds = {}
+    offset = header["pcItemsOffset"]
+    for pocket, count, encrypted in pockets:
+        bounds[pocket] = (offset, header[count], encrypted)
+        offset += header[count] * item_slot_size
+    return bounds
+
+def pocketMask(count: int, key: int) -> int:
+    # XORing a pocket read as a little endian integer with this flips the quantities' bits, not the ids'
+    return int.from_bytes((key & 0xFFFF).to_bytes(2, 'little').rjust(4, b'\0') * count, 'little')
+
+def cryptPocket(data, count: int, key: int) -> bytes:
+    return (int.from_bytes(data, 'little') ^ pocketMask(count, key)).to_bytes(count * item_slot_size, 'little')
+
+def decodePocket(data, count: int, key: int, rom: dict) -> list:
+    # The non empty slots of a pocket, in order
+    if key:
+        data = cryptPocket(data, count, key)
+    words = array('H', bytes(data))
+    if sys.byteorder != 'little':
+        words.byteswap()
+    items = rom['items']
+    return [
+        ItemSlot(id=itemId, name=items[itemId]['name'] if itemId < len(items) else None, quantity=quantity)
+        for itemId, quantity in zip(words[0::2], words[1::2]) if itemId
+    ]
+
+def readBag(block1: bytes, header: dict, security_key: int, rom: dict) -> dict:
+    bag = {}
+    for pocket, (offset, count, encrypted) in pocketBounds(header).items():
+        bag[pocket] = decodePocket(block1[offset : offset + count*item_slot_size], count, security_key if encrypted else 0, rom)
+    return bag
+
+def readSaveBag(sections: list, header: dict, security_key: int, rom: dict, sizes: list):
+    # The bag of a save, None when the rom header doesn't locate it
+    if not header or not header.get("pcItemsOffset"):
+        return None
+    return readBag(readSaveBlock1(sections, sizes), header, security_key, rom)
+
+def encodePocket(slots: list, count: int, key: int, rom: dict) -> bytes:
+    if len(slots) > count:
+        raise ValueError(f"{len(slots)} items don't fit in a pocket of {count} slots")
+    words = array('H', bytes(count * item_slot_size))
+    for i, slot in enumerate(slots):
+        itemId = slot.get('id')
+        if itemId is None:
+            itemId = nameIndex(rom, 'items')[slot['name']]
+        if not 0 <= slot['quantity'] <= 0xFFFF:
+            raise ValueError(f"Invalid quantity {slot['quantity']} for {slot.get('name') or itemId}")
+        words[2*i], words[2*i + 1] = itemId, slot['quantity']
+    if sys.byteorder != 'little':
+        words.byteswap()
+    data = words.tobytes()
+    # Empty slots are encrypted as well, like the game clears them with a quantity of 0
+    return cryptPocket(data, count, key) if key else data
+
+def encodeBag(bag: dict, header: dict, security_key: int, rom: dict) -> list:
+    # The (section id, offset in the section, data) patches writing the bag back
+    patches = []
+    for pocket, (offset, count, encrypted) in pocketBounds(header).items():
+        if pocket not in bag:
+            continue
+        data = encodePocket(bag[pocket], count, security_key if encrypted else 0, rom)
+        for section_id, section_offset, start, length in saveBlock1Chunks(offset, len(data)):
+            patches.append((section_id, section_offset, data[start:start+length]))
+    return patches
@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from .rom import parseRom
+from .save import parseSave
+
+# The rom database used by the worker processes. When processes are forked, it is set before the pool is
+# created so that every worker inherits it from the parent's memory instead of receiving a pickled copy.
+# Otherwise each worker loads it once in initWorker, from the snapshot cache when a cache_dir is given.
+worker_rom = None
+
+def initWorker(rom_path: str, cache_dir: str):
+    global worker_rom
+    if worker_rom is None:
+        worker_rom = parseRom(rom_path, cache_dir=cache_dir)
+
+def parseOne(path: str, game_version: str) -> dict:
+    data = parseSave(path, game_version, worker_rom)
+    if "slotData" in data:
+        # slotData is a memoryview over the worker's copy of the file, which can't be sent back as is
+        data["slotData"] = bytes(data["slotData"])
+    return data
+
+def parseSaves(rom_path: str, save_paths, game_version: str, workers: int = None, cache_dir: str = None):
+    # Parses many saves made on the same rom using a pool of processes, the rom only being parsed once.
+    # Yields (path, processed_data, error) tuples in completion order. A save failing to parse doesn't stop
+    # the batch: its error is yielded in place of its data.
+    global worker_rom
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        worker_rom = parseRom(rom_path, cache_dir=cache_dir)
+    else:
+        context = None
+
+    save_paths = iter(save_paths)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initWorker, initargs=(rom_path, cache_dir)) as pool:
+            # Only a few tasks per worker are queued at a time, so that huge folders don't pile up pending futures
+            pending = {}
+            def submitNext():
+                for path in save_paths:
+                    pending[pool.submit(parseOne, path, game_version)] = path
+                    return True
+                return False
+
+            while len(pending) < workers * 4 and submitNext():
+                pass
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        yield path, future.result(), None
+                    except Exception as e:
+                        yield path, None, e
+                    submitNext()
+    finally:
+        worker_rom = None
+
+def listSaves(directory: str) -> list:
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith('.sav'))
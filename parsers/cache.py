@@ -0,0 +1,46 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+# Parsed rom databases are stored as pickled snapshots named after the blake2b hash of the rom's content.
+# Each snapshot also records the key it was built with, so that a snapshot made by another version of the
+# parsers is ignored and rebuilt instead of being loaded.
+# Bump this whenever the layout of the dict returned by parseRom changes.
+cache_format_version = 2
+
+def hashRom(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def snapshotPath(cache_dir: str, rom_hash: str) -> str:
+    return os.path.join(cache_dir, f"{rom_hash}.romdb")
+
+def cacheKey(expansionVersion: str, parser_version) -> tuple:
+    return (cache_format_version, expansionVersion, parser_version)
+
+def loadSnapshot(cache_dir: str, rom_hash: str):
+    path = snapshotPath(cache_dir, rom_hash)
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(snapshot, dict) or 'key' not in snapshot or 'rom' not in snapshot:
+        return None
+    return snapshot
+
+def saveSnapshot(cache_dir: str, rom_hash: str, key: tuple, rom: dict):
+    os.makedirs(cache_dir, exist_ok=True)
+    # We write to a temporary file first so that a concurrent run never loads a half-written snapshot
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'key': key, 'rom': rom}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshotPath(cache_dir, rom_hash))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,56 @@
+import codecs
+
+# Gen III (international) character encoding, as defined in pokeemerald's charmap.txt.
+# Control codes and multi-character glyphs (Lv, PK, MN...) are left out, and decode to a space.
+glyphs = {
+    0x00: ' ',
+    0x01: 'À', 0x02: 'Á', 0x03: 'Â', 0x04: 'Ç', 0x05: 'È', 0x06: 'É', 0x07: 'Ê', 0x08: 'Ë',
+    0x09: 'Ì', 0x0B: 'Î', 0x0C: 'Ï', 0x0D: 'Ò', 0x0E: 'Ó', 0x0F: 'Ô', 0x10: 'Œ', 0x11: 'Ù',
+    0x12: 'Ú', 0x13: 'Û', 0x14: 'Ñ', 0x15: 'ß', 0x16: 'à', 0x17: 'á', 0x19: 'ç', 0x1A: 'è',
+    0x1B: 'é', 0x1C: 'ê', 0x1D: 'ë', 0x1E: 'ì', 0x20: 'î', 0x21: 'ï', 0x22: 'ò', 0x23: 'ó',
+    0x24: 'ô', 0x25: 'œ', 0x26: 'ù', 0x27: 'ú', 0x28: 'û', 0x29: 'ñ', 0x2A: 'º', 0x2B: 'ª',
+    0x2D: '&', 0x2E: '+', 0x35: '=', 0x36: ';',
+    0x51: '¿', 0x52: '¡', 0x5A: 'Í', 0x5B: '%', 0x5C: '(', 0x5D: ')', 0x68: 'â', 0x6F: 'í',
+    0x79: '↑', 0x7A: '↓', 0x7B: '←', 0x7C: '→', 0x85: '<', 0x86: '>',
+    0xAB: '!', 0xAC: '?', 0xAD: '.', 0xAE: '-', 0xAF: '・', 0xB0: '…', 0xB1: '“', 0xB2: '”',
+    0xB3: '‘', 0xB4: '’', 0xB5: '♂', 0xB6: '♀', 0xB7: '¥', 0xB8: ',', 0xB9: '×', 0xBA: '/',
+    0xEF: '►', 0xF0: ':', 0xF1: 'Ä', 0xF2: 'Ö', 0xF3: 'Ü', 0xF4: 'ä', 0xF5: 'ö', 0xF6: 'ü',
+    0xFE: '\n',
+}
+glyphs.update({0xA1 + i: c for i, c in enumerate('0123456789')})
+glyphs.update({0xBB + i: c for i, c in enumerate('ABCDEFGHIJKLMNOPQRSTUVWXYZ')})
+glyphs.update({0xD5 + i: c for i, c in enumerate('abcdefghijklmnopqrstuvwxyz')})
+
+terminator = 0xFF
+# The terminator decodes to NUL so that a whole table can be decoded at once and split afterwards
+decoding_table = ''.join('\0' if b == terminator else glyphs.get(b, ' ') for b in range(256))
+encoding_map = {ord(c): b for b, c in glyphs.items() if b != 0x00}
+encoding_map[ord(' ')] = 0x00
+# ASCII lookalikes, so that text typed on a keyboard can be encoded
+encoding_map.update({ord("'"): 0xB4, ord('"'): 0xB2, ord('*'): 0xB9})
+
+def decode(data) -> str:
+    # Decodes a string up to its terminator, or the whole buffer if it fills its field
+    data = bytes(data) if isinstance(data, memoryview) else data
+    end = data.find(terminator)
+    if end != -1:
+        data = data[:end]
+    return codecs.charmap_decode(data, 'strict', decoding_table)[0]
+
+def encode(text: str, length: int = None) -> bytes:
+    # Encodes a string, terminated then padded with 0xFF up to length if one is given.
+    # A string exactly as long as its field isn't terminated, like the game does for 10 characters nicknames.
+    data = codecs.charmap_encode(text, 'strict', encoding_map)[0]
+    if length is None:
+        return data + bytes([terminator])
+    if len(data) > length:
+        raise ValueError(f"\"{text}\" is {len(data)} characters long, which doesn't fit in {length} bytes")
+    return data + bytes([terminator]) * (length - len(data))
+
+def decodeTable(data, offset: int, count: int, stride: int, length: int = None, field_offset: int = 0) -> list:
+    # Decodes count fixed-stride strings in one call, e.g. every move name of the moveNames table.
+    # field_offset and length locate the string inside each record when the records aren't just strings.
+    if length is None:
+        length = stride - field_offset
+    text = codecs.charmap_decode(bytes(data[offset : offset + stride*count]), 'strict', decoding_table)[0]
+    return [text[i + field_offset : i + field_offset + length].partition('\0')[0].strip() for i in range(0, stride*count, stride)]
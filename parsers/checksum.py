@@ -0,0 +1,58 @@
+import struct
+import sys
+from array import array
+from structures.saves import section_size, section_data_size, section_sizes
+
+# Gen III validates each save section with a 16 bits checksum of its data, and each pokemon with a 16 bits
+# checksum of its decrypted substructures.
+# Both are sums of words, computed here by summing a memoryview cast to words rather than unpacking each word.
+
+footer_offset = section_size - 12
+section_signature = 0x08012025
+
+def _words(data, typecode: str):
+    if sys.byteorder == 'little':
+        return memoryview(data).cast(typecode)
+    words = array(typecode, bytes(data))
+    words.byteswap()
+    return words
+
+def sectionChecksum(data, size: int) -> int:
+    # Sum of the section's first size bytes as 32 bits words, folded to 16 bits
+    total = sum(_words(memoryview(data)[:size], 'I')) & 0xFFFFFFFF
+    return ((total >> 16) + (total & 0xFFFF)) & 0xFFFF
+
+def pokemonChecksum(substructs) -> int:
+    # Sum of the 48 decrypted bytes as 16 bits words. The order of the substructures doesn't matter
+    return sum(_words(substructs, 'H')) & 0xFFFF
+
+def getSectionSizes(header: dict = None) -> list:
+    # The amount of data checksummed in each section. The save blocks' sizes are given by the rom header when
+    # available, as expansion hacks can grow them, otherwise vanilla emerald's sizes are used.
+    if not header or not header.get('saveBlock2Size') or not header.get('saveBlock1Size'):
+        return section_sizes
+    saveBlock2Size = header['saveBlock2Size']
+    saveBlock1Size = header['saveBlock1Size']
+    if saveBlock2Size > section_data_size or saveBlock1Size > 4 * section_data_size:
+        return section_sizes
+    sizes = [saveBlock2Size]
+    for i in range(4):
+        sizes.append(max(0, min(section_data_size, saveBlock1Size - i * section_data_size)))
+    return sizes + section_sizes[5:]
+
+def updateSectionChecksum(buffer: bytearray, offset: int, sizes: list = section_sizes) -> int:
+    # Recomputes and stores the checksum of the section starting at offset in buffer, after it was edited
+    section_id = struct.unpack_from('<H', buffer, offset + footer_offset)[0]
+    checksum = sectionChecksum(memoryview(buffer)[offset : offset + section_size], sizes[section_id])
+    struct.pack_into('<H', buffer, offset + footer_offset + 2, checksum)
+    return checksum
+
+def updateSlotChecksums(buffer: bytearray, slot_offset: int, sizes: list = section_sizes):
+    for i in range(14):
+        updateSectionChecksum(buffer, slot_offset + i * section_size, sizes)
+
+def updatePokemonChecksum(record: bytearray, substructs) -> int:
+    # Stores the checksum of a pokemon whose decrypted substructures were edited, before it is encrypted again
+    checksum = pokemonChecksum(substructs)
+    struct.pack_into('<H', record, 28, checksum)
+    return checksum
@@ -0,0 +1,266 @@
+import hashlib
+from . import utils
+from . import checksum
+from .profiling import metrics
+from .pokemon import decodePokemonBatch, isOccupied
+from .save import getSaveInfo, selectSlot, readTrainer, readStorage
+from .progress import readProgress, flagsBounds, dexFlagsSize, pokedex_header_size, saveBlock1Chunks, vars_start
+from .bag import readSaveBag, pocketBounds, item_slot_size
+from structures.records import Record
+from structures.saves import offsets_dict, gamedata_dict, layouts_dict, section_data_size, pc_sections
+
+# Finds what changed between two saves, or between the two slots of a save file.
+# Each section's data is hashed, and only the sections whose hashes differ are looked at. In those, pokemon records
+# are compared as raw bytes first, so only the pokemon that actually changed are decrypted and decoded.
+# Changes are reported as dicts:
+#   {"where": "team", "slot": 2, "field": "Level", "old": 50, "new": 51}
+#   {"where": "box", "box": 0, "slot": 4, "field": "pokemon", "old": None, "new": "PIKACHU"}
+#   {"where": "trainer", "field": "name", "old": "MAY", "new": "BRENDAN"}
+#   {"where": "bag", "pocket": "balls", "field": "Poke Ball", "old": 5, "new": 4}
+#   {"where": "flags", "field": 0x820, "old": False, "new": True}
+#   {"where": "vars", "field": 0x4050, "old": 0, "new": 2}
+#   {"where": "pokedex", "dex": 25, "field": "owned", "old": False, "new": True}
+#   {"where": "section", "section": 2, "field": "data", "old": None, "new": 12} (changed bytes none of the above cover)
+#
+#   for previous, current, changes in diffHistory(paths, "expansion", rom):
+#       ...
+
+# Pokemon fields which aren't reported, as they follow from the others
+ignored_fields = ('raw', 'substructs', 'checksum', 'Stats')
+
+def sectionHashes(save: dict) -> list:
+    # The hash of each section's data (without its footer, which holds the save index), None for missing sections.
+    # They are kept in the save, so that a save compared several times is only hashed once.
+    if "hashes" not in save:
+        save["hashes"] = [
+            hashlib.blake2b(section["rawData"][:section_data_size], digest_size=16).digest() if section else None
+            for section in save["sections"]
+        ]
+        metrics.count('diff.sectionsHashed', len(save["sections"]))
+    return save["hashes"]
+
+def loadSlot(path_or_data, game_version: str, rom: dict, slot: str = None) -> dict:
+    # The getSaveInfo of a save file (or its bytes): its current slot, or slot "A" or "B"
+    data = utils.byteArrayFromFile(path_or_data) if isinstance(path_or_data, str) else path_or_data
+    offsets = offsets_dict[game_version][rom["expansionVersion"]]
+    sizes = checksum.getSectionSizes(rom.get("header"))
+    if slot is None:
+        return selectSlot(data, offsets, sizes)
+    bounds = offsets["save_a" if slot == "A" else "save_b"]
+    save = getSaveInfo(memoryview(data)[bounds[0]:bounds[1]], sizes)
+    save["slot"] = slot
+    return save
+
+def diffSaveInfos(old: dict, new: dict, game_version: str, rom: dict) -> list:
+    # Compares two getSaveInfo results
+    offsets = offsets_dict[game_version][rom["expansionVersion"]]
+    layouts = layouts_dict[game_version][rom["expansionVersion"]]
+    changed = [i for i, (a, b) in enumerate(zip(sectionHashes(old), sectionHashes(new))) if a != b]
+    metrics.count('diff.sectionsChanged', len(changed))
+    if not changed:
+        return []
+
+    changes = []
+    old_sections, new_sections = old["sections"], new["sections"]
+    missing = [i for i in changed if not old_sections[i] or not new_sections[i]]
+    for i in missing:
+        changes.append({"where": "section", "section": i, "field": "present", "old": bool(old_sections[i]), "new": bool(new_sections[i])})
+    if missing:
+        # A save missing a section can't be decoded, only the sections both saves have are compared
+        changed = [i for i in changed if i not in missing]
+
+    saveblocks_changed = [i for i in changed if i < pc_sections[0]]
+    if saveblocks_changed:
+        gamedata = gamedata_dict[game_version]
+        old_trainer = readTrainer(old_sections[0]["rawData"], offsets, gamedata)
+        new_trainer = readTrainer(new_sections[0]["rawData"], offsets, gamedata)
+    if 0 in changed:
+        for field, value in new_trainer.items():
+            if old_trainer.get(field) != value:
+                changes.append({"where": "trainer", "field": field, "old": old_trainer.get(field), "new": value})
+        if old["playtime"] != new["playtime"]:
+            changes.append({"where": "trainer", "field": "playtime", "old": old["playtime"], "new": new["playtime"]})
+
+    if 1 in changed:
+        changes += diffTeams(old_sections[1]["rawData"], new_sections[1]["rawData"], offsets, layouts, rom)
+
+    if saveblocks_changed and all(old_sections[i] and new_sections[i] for i in range(pc_sections[0])):
+        header = rom.get("header")
+        sizes = checksum.getSectionSizes(header)
+        changes += diffProgress(readProgress(old_sections, header, offsets, sizes), readProgress(new_sections, header, offsets, sizes))
+        changes += diffBags(readSaveBag(old_sections, header, old_trainer["security_key"], rom, sizes),
+                            readSaveBag(new_sections, header, new_trainer["security_key"], rom, sizes))
+        # The bytes changed outside of the fields compared above
+        ranges = decodedRanges(header, offsets, layouts)
+        for i in saveblocks_changed:
+            uncovered = changedBytes(old_sections[i]["rawData"], new_sections[i]["rawData"], ranges.get(i, ()))
+            if uncovered:
+                changes.append({"where": "section", "section": i, "field": "data", "old": None, "new": uncovered})
+
+    if any(i in changed for i in pc_sections) and not missing:
+        changes += diffBoxes(readStorage(old_sections), readStorage(new_sections), offsets, layouts, rom, [i for i in changed if i in pc_sections])
+    return changes
+
+def changedBytes(a, b, ignored=()) -> int:
+    # The amount of bytes which differ in the data of two sections, outside of the ignored (start, end) ranges
+    a, b = bytes(a[:section_data_size]), bytes(b[:section_data_size])
+    return sum(x != y and not any(start <= k < end for start, end in ignored) for k, (x, y) in enumerate(zip(a, b)))
+
+def decodedRanges(header: dict, offsets: dict, layouts: dict) -> dict:
+    # The (start, end) byte ranges of sections 0 to 4 whose changes are reported as fields, by section id
+    ranges = {0: [(0, 8), (offsets["gender"], offsets["gender"] + 1), tuple(offsets["trainer_id"]), tuple(offsets["security_key"]), (14, 19)],
+              1: [tuple(offsets["team_count"]), (offsets["team_offset"], offsets["team_offset"] + 6 * layouts["pokemon"].size)]}
+
+    def block1(offset: int, size: int):
+        for section_id, section_offset, _, length in saveBlock1Chunks(offset, size):
+            ranges.setdefault(section_id, []).append((section_offset, section_offset + length))
+
+    if not header:
+        return ranges
+    if header.get("flagsOffset"):
+        block1(*flagsBounds(header, offsets))
+    if header.get("varsOffset"):
+        block1(header["varsOffset"], offsets["vars_count"] * 2)
+    if header.get("pokedexOffset") and header.get("pokedexCount"):
+        size = dexFlagsSize(header["pokedexCount"])
+        start = header["pokedexOffset"] + pokedex_header_size
+        ranges[0].append((start, start + 2 * size))
+        for copy in ("seen1Offset", "seen2Offset"):
+            if header.get(copy):
+                block1(header[copy], size)
+    if header.get("pcItemsOffset"):
+        for offset, count, _ in pocketBounds(header).values():
+            block1(offset, count * item_slot_size)
+    return ranges
+
+def diffBits(old, new, where: str) -> list:
+    # One change per bit differing between two Bitsets
+    if old is None or new is None:
+        return []
+    return [{"where": where, "field": i, "old": old[i], "new": new[i]} for i in (old ^ new).indexes()]
+
+def diffProgress(old: dict, new: dict) -> list:
+    changes = diffBits(old["flags"], new["flags"], "flags")
+    if old["vars"] is not None and new["vars"] is not None:
+        changes += [{"where": "vars", "field": vars_start + i, "old": a, "new": b} for i, (a, b) in enumerate(zip(old["vars"], new["vars"])) if a != b]
+    if old["pokedex"] is not None and new["pokedex"] is not None:
+        for key in ("owned", "seen"):
+            for change in diffBits(old["pokedex"][key], new["pokedex"][key], "pokedex"):
+                changes.append({"where": "pokedex", "dex": change["field"] + 1, "field": key, "old": change["old"], "new": change["new"]})
+    return changes
+
+def diffBags(old: dict, new: dict) -> list:
+    # The quantity of each item, by pocket, whatever the slots they are in
+    if old is None or new is None:
+        return []
+    changes = []
+    for pocket in new:
+        totals = []
+        for bag in (old, new):
+            quantities = {}
+            for slot in bag.get(pocket, ()):
+                key = slot["name"] or slot["id"]
+                quantities[key] = quantities.get(key, 0) + slot["quantity"]
+            totals.append(quantities)
+        for item in dict.fromkeys(list(totals[0]) + list(totals[1])):
+            if totals[0].get(item, 0) != totals[1].get(item, 0):
+                changes.append({"where": "bag", "pocket": pocket, "field": item, "old": totals[0].get(item, 0), "new": totals[1].get(item, 0)})
+    return changes
+
+def diffTeams(old_data, new_data, offsets: dict, layouts: dict, rom: dict) -> list:
+    size = layouts["pokemon"].size
+    counts = [int.from_bytes(data[offsets["team_count"][0]:offsets["team_count"][1]], 'little') for data in (old_data, new_data)]
+    changes = []
+    if counts[0] != counts[1]:
+        changes.append({"where": "team", "field": "team_count", "old": counts[0], "new": counts[1]})
+    pairs = []
+    for slot in range(max(counts)):
+        start = offsets["team_offset"] + slot*size
+        old_record = bytes(old_data[start:start+size]) if slot < counts[0] else None
+        new_record = bytes(new_data[start:start+size]) if slot < counts[1] else None
+        if old_record != new_record:
+            pairs.append(({"where": "team", "slot": slot}, old_record, new_record))
+    return changes + diffPokemon(pairs, layouts, rom)
+
+def diffBoxes(old_storage: bytes, new_storage: bytes, offsets: dict, layouts: dict, rom: dict, sections: list) -> list:
+    # Only the records overlapping the changed sections are compared
+    size = layouts["box_pokemon"].size
+    box_size = offsets["pc_box_size"]
+    chunks = [((i - pc_sections[0]) * section_data_size, (i - pc_sections[0] + 1) * section_data_size) for i in sections]
+    changes = []
+
+    def touched(start: int, end: int) -> bool:
+        return any(start < chunk_end and end > chunk_start for chunk_start, chunk_end in chunks)
+
+    if touched(offsets["pc_current_box"], offsets["pc_current_box"] + 1) and old_storage[offsets["pc_current_box"]] != new_storage[offsets["pc_current_box"]]:
+        changes.append({"where": "box", "field": "current_box", "old": old_storage[offsets["pc_current_box"]], "new": new_storage[offsets["pc_current_box"]]})
+
+    pairs = []
+    for box in range(offsets["pc_box_count"]):
+        name_offset = offsets["pc_box_names_offset"] + box*9
+        if touched(name_offset, name_offset + 9) and old_storage[name_offset:name_offset+9] != new_storage[name_offset:name_offset+9]:
+            changes.append({"where": "box", "box": box, "field": "name", "old": utils.readstring(old_storage[name_offset:name_offset+9]), "new": utils.readstring(new_storage[name_offset:name_offset+9])})
+        wallpaper_offset = offsets["pc_box_wallpapers_offset"] + box
+        if touched(wallpaper_offset, wallpaper_offset + 1) and old_storage[wallpaper_offset] != new_storage[wallpaper_offset]:
+            changes.append({"where": "box", "box": box, "field": "wallpaper", "old": old_storage[wallpaper_offset], "new": new_storage[wallpaper_offset]})
+
+        for slot in range(box_size):
+            start = offsets["pc_boxes_offset"] + (box*box_size + slot)*size
+            if not touched(start, start + size):
+                continue
+            old_record, new_record = old_storage[start:start+size], new_storage[start:start+size]
+            if old_record != new_record:
+                pairs.append(({"where": "box", "box": box, "slot": slot},
+                              old_record if isOccupied(old_record) else None,
+                              new_record if isOccupied(new_record) else None))
+    return changes + diffPokemon(pairs, layouts, rom)
+
+def diffPokemon(pairs: list, layouts: dict, rom: dict) -> list:
+    # pairs are (location, old record, new record) tuples, a record being None for an empty slot.
+    # Every record is decoded in a single batch.
+    records = [record for _, old_record, new_record in pairs for record in (old_record, new_record) if record is not None]
+    decoded = iter(decodePokemonBatch(records, rom, layouts))
+    metrics.count('diff.pokemonDecoded', len(records))
+    changes = []
+    for location, old_record, new_record in pairs:
+        old = next(decoded) if old_record is not None else None
+        new = next(decoded) if new_record is not None else None
+        if old is None or new is None:
+            if old is not None or new is not None:
+                changes.append({**location, "field": "pokemon", "old": old and old["species"], "new": new and new["species"]})
+            continue
+        for field, value in new.items():
+            if field in ignored_fields:
+                continue
+            old_value = old.get(field)
+            if isinstance(value, Record):
+                for key, sub_value in value.items():
+                    if old_value.get(key) != sub_value:
+                        changes.append({**location, "field": f"{field}.{key}", "old": old_value.get(key), "new": sub_value})
+            elif old_value != value:
+                changes.append({**location, "field": field, "old": old_value, "new": value})
+    return changes
+
+def diffSaves(old_path, new_path, game_version: str, rom: dict) -> list:
+    # Compares the current slots of two save files
+    with metrics.phase('diffSaves'):
+        return diffSaveInfos(loadSlot(old_path, game_version, rom), loadSlot(new_path, game_version, rom), game_version, rom)
+
+def diffSlots(path, game_version: str, rom: dict) -> list:
+    # Compares both slots of a save file, from slot A to slot B
+    data = utils.byteArrayFromFile(path) if isinstance(path, str) else path
+    with metrics.phase('diffSaves'):
+        return diffSaveInfos(loadSlot(data, game_version, rom, "A"), loadSlot(data, game_version, rom, "B"), game_version, rom)
+
+def diffHistory(paths, game_version: str, rom: dict):
+    # Compares each save of a history to the next one, yielding (previous path, path, changes).
+    # Each save is read and hashed once.
+    previous = None
+    previous_path = None
+    for path in paths:
+        current = loadSlot(path, game_version, rom)
+        if previous is not None:
+            with metrics.phase('diffSaves'):
+                changes = diffSaveInfos(previous, current, game_version, rom)
+            yield previous_path, path, changes
+        previous, previous_path = current, path
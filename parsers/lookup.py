@@ -0,0 +1,101 @@
+import difflib
+from bisect import bisect_left
+from .profiling import metrics
+
+# Reverse indexes of the rom tables, to find the id of a species, move, item or ability from its name.
+# Names are matched exactly first, then loosely: case, spaces and punctuation are ignored, so that
+# "Mr. Mime", "MR. MIME" and "mrmime" are the same name, like Showdown does.
+# The indexes of a rom are built the first time they are needed and kept in the rom dict.
+#
+#   from parsers.lookup import lookupId
+#   lookupId(rom, 'moves', 'Thunderbolt')
+
+# The rom dict key of each table
+tables = {
+    'species': 'species',
+    'moves': 'movesNames',
+    'items': 'items',
+    'abilities': 'abilities',
+}
+
+def normalizeName(name: str) -> str:
+    return ''.join(c for c in name.casefold() if c.isalnum())
+
+class NameIndex:
+    def __init__(self, names):
+        # names is an iterable of (id, name). When several records share a name, the lowest id is kept
+        self.exact = {}
+        self.normalized = {}
+        self.names = {} # The name shown for each normalized name
+        for id, name in names:
+            if not name:
+                continue
+            self.exact.setdefault(name, id)
+            key = normalizeName(name)
+            if key and key not in self.normalized:
+                self.normalized[key] = id
+                self.names[key] = name
+        self.sorted = sorted(self.normalized) # Normalized names, for prefix lookups
+
+    def __len__(self):
+        return len(self.normalized)
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+    def find(self, name: str):
+        # The id of the given name, or None if no record has this name
+        id = self.exact.get(name)
+        if id is None:
+            id = self.normalized.get(normalizeName(name))
+        return id
+
+    def __getitem__(self, name: str) -> int:
+        id = self.find(name)
+        if id is None:
+            suggestions = self.closest(name)
+            hint = f", did you mean {' or '.join(suggestions)} ?" if suggestions else ""
+            raise KeyError(f"Unknown name \"{name}\"{hint}")
+        return id
+
+    def startingWith(self, prefix: str, limit: int = None) -> list:
+        # (name, id) of every record whose name starts with prefix, in alphabetical order
+        prefix = normalizeName(prefix)
+        matches = []
+        for k in range(bisect_left(self.sorted, prefix), len(self.sorted)):
+            key = self.sorted[k]
+            if not key.startswith(prefix) or (limit is not None and len(matches) >= limit):
+                break
+            matches.append((self.names[key], self.normalized[key]))
+        return matches
+
+    def closest(self, name: str, count: int = 3, cutoff: float = 0.6) -> list:
+        # The names closest to a misspelled one
+        keys = difflib.get_close_matches(normalizeName(name), self.sorted, count, cutoff)
+        return [self.names[key] for key in keys]
+
+def tableNames(table):
+    # Yields the (id, name) of a table, without decoding its records when the names were decoded apart
+    names = getattr(table, 'names', None)
+    if names is not None:
+        return enumerate(names)
+    entries = table.items() if hasattr(table, 'items') else enumerate(table)
+    return ((id, entry if isinstance(entry, str) else entry['name']) for id, entry in entries)
+
+def nameIndex(rom: dict, table: str) -> NameIndex:
+    indexes = rom.setdefault('indexes', {})
+    index = indexes.get(table)
+    if index is None:
+        with metrics.phase('buildNameIndex'):
+            index = NameIndex(tableNames(rom[tables[table]]))
+        metrics.count('nameIndex.built')
+        indexes[table] = index
+    return index
+
+def lookupId(rom: dict, table: str, name: str) -> int:
+    # Raises a KeyError suggesting the closest names when the name is unknown
+    return nameIndex(rom, table)[name]
+
+def buildIndexes(rom: dict) -> dict:
+    # Builds every index at once, e.g. before forking workers which will all need them
+    return {table: nameIndex(rom, table) for table in tables}
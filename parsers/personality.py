@@ -0,0 +1,161 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from .pokemon import getGender, getivs
+
+# Finds personality values (and optionally IVs) giving a pokemon the requested nature, gender and shininess.
+# Instead of testing the 2^32 personalities, matching ones are built directly:
+# - the personality's low byte decides the gender, so only the allowed low bytes are looked at,
+# - a pokemon is shiny when (tid ^ sid ^ high ^ low) < 8, high and low being the personality's 16 bits halves,
+#   so for a given low half only 8 high halves can be shiny,
+# - the nature is personality % 25 = (high * 65536 + low) % 25, and 65536 % 25 == 11, so for a given low half
+#   the high half has to be ≡ (nature - low) * 11⁻¹ (mod 25), 11⁻¹ being 16 (mod 25).
+#
+# The Method 1 functions find personalities and IVs the game's random number generator can produce together
+# (personality low and high halves, then the two IV halves, from four consecutive calls), which is what legality
+# checkers expect of wild pokemon.
+#
+#   for spread in method1Spreads(ivs=[31]*6, nature=natures.index("Adamant")):
+#       spread["personality"], spread["ivWord"]
+
+lcg_multiplier = 0x41C64E6D
+lcg_increment = 0x6073
+lcg_inverse_multiplier = 0xEEB9EB65
+lcg_inverse_increment = 0x0A3561A1
+
+def nextSeed(seed: int) -> int:
+    return (seed * lcg_multiplier + lcg_increment) & 0xFFFFFFFF
+
+def previousSeed(seed: int) -> int:
+    return (seed * lcg_inverse_multiplier + lcg_inverse_increment) & 0xFFFFFFFF
+
+def isShiny(personality: int, otId: int) -> bool:
+    return ((otId >> 16) ^ (otId & 0xFFFF) ^ (personality >> 16) ^ (personality & 0xFFFF)) < 8
+
+def matches(personality: int, nature: int = None, gender: str = None, genderRatio: int = 127, shiny: bool = None, otId: int = 0) -> bool:
+    # gender is "M" or "F", like in Showdown sets. None means anything goes
+    return ((nature is None or personality % 25 == nature)
+        and (gender is None or getGender(personality, genderRatio) == f"({gender})")
+        and (shiny is None or isShiny(personality, otId) == shiny))
+
+def searchPersonalities(nature: int = None, gender: str = None, genderRatio: int = 127, shiny: bool = None, otId: int = 0, limit: int = None):
+    # Yields the personalities matching the constraints, ordered by their low half
+    lows = {low for low in range(256) if gender is None or getGender(low, genderRatio) == f"({gender})"}
+    trainer = (otId >> 16) ^ (otId & 0xFFFF)
+    found = 0
+    for low_half in range(65536):
+        if gender is not None and (low_half & 0xFF) not in lows:
+            continue
+        if shiny:
+            highs = [low_half ^ trainer ^ x for x in range(8)]
+            if nature is not None:
+                highs = [high for high in highs if (high * 11 + low_half) % 25 == nature]
+        else:
+            highs = range((nature - low_half) * 16 % 25, 65536, 25) if nature is not None else range(65536)
+        for high in highs:
+            if shiny is False and (high ^ low_half ^ trainer) < 8:
+                continue
+            yield (high << 16) | low_half
+            found += 1
+            if limit is not None and found >= limit:
+                return
+
+def method1Seeds(personality: int):
+    # Yields the seeds from which Method 1 generates this personality
+    low_half, high_half = personality & 0xFFFF, personality >> 16
+    for bits in range(65536):
+        state = (low_half << 16) | bits
+        if nextSeed(state) >> 16 == high_half:
+            yield previousSeed(state)
+
+def method1FromSeed(seed: int) -> dict:
+    states = []
+    for _ in range(4):
+        seed = nextSeed(seed)
+        states.append(seed >> 16)
+    personality = (states[1] << 16) | states[0]
+    ivWord = (states[2] & 0x7FFF) | ((states[3] & 0x7FFF) << 15)
+    return {"personality": personality, "ivWord": ivWord}
+
+def spread(seed: int, personality: int, ivWord: int, otId: int, genderRatio: int) -> dict:
+    return {
+        "seed": seed,
+        "personality": personality,
+        "ivWord": ivWord, # The IVs' bits of the IV word, see setivs
+        "ivs": getivs(ivWord),
+        "nature": personality % 25,
+        "gender": getGender(personality, genderRatio),
+        "shiny": isShiny(personality, otId),
+    }
+
+def ivHalves(ivs) -> tuple:
+    # The IV halves Method 1 draws (hp/atk/def, then spe/spa/spd, 5 bits each) which fit the requested IVs.
+    # ivs lists the hp, atk, def, spe, spa and spd IVs, each being a value, a range, or None for any
+    allowed = [range(32) if iv is None else (iv if isinstance(iv, range) else (iv,)) for iv in ivs]
+    halves = []
+    for stats in (allowed[0:3], allowed[3:6]):
+        halves.append([a | (b << 5) | (c << 10) for a, b, c in product(*stats)])
+    return halves[0], halves[1]
+
+def searchHalves(halves: list, otherHalves, constraints: dict, second: bool = False, limit: int = None) -> list:
+    # The Method 1 spreads whose first IV half (drawn by the third random call) is one of halves, and second one
+    # (drawn by the fourth call) is in otherHalves. With second, halves are second halves and otherHalves first ones.
+    # A call gives its half in the bits 16 to 30 of its state, so only the lowest 16 bits and top bit of the state
+    # are unknown. The other call's state is found by stepping the generator forwards (or backwards with second).
+    # The search stops once limit spreads are found.
+    otherHalves = set(otherHalves)
+    otId = constraints.get("otId", 0)
+    genderRatio = constraints.get("genderRatio", 127)
+    multiplier, increment = (lcg_inverse_multiplier, lcg_inverse_increment) if second else (lcg_multiplier, lcg_increment)
+    results = []
+    for half in halves:
+        for top in (0, 0x80000000):
+            base = top | (half << 16)
+            for bits in range(65536):
+                state = base | bits
+                other_state = (state * multiplier + increment) & 0xFFFFFFFF
+                other = (other_state >> 16) & 0x7FFF
+                if other not in otherHalves:
+                    continue
+                state3 = other_state if second else state
+                state2 = previousSeed(state3)
+                state1 = previousSeed(state2)
+                personality = (state2 & 0xFFFF0000) | (state1 >> 16)
+                if matches(personality, **constraints):
+                    ivWord = (other | (half << 15)) if second else (half | (other << 15))
+                    results.append(spread(previousSeed(state1), personality, ivWord, otId, genderRatio))
+                    if limit is not None and len(results) >= limit:
+                        return results
+    return results
+
+def method1Spreads(ivs=None, nature: int = None, gender: str = None, genderRatio: int = 127, shiny: bool = None, otId: int = 0, limit: int = None, workers: int = 1) -> list:
+    # Returns Method 1 spreads matching the constraints.
+    # With IVs, the search starts from the IVs (2^17 states per IV half), which is split over workers
+    # processes, each stopping once it found limit spreads. Without, it starts from the matching personalities, most of which have a Method 1 seed.
+    constraints = {"nature": nature, "gender": gender, "genderRatio": genderRatio, "shiny": shiny, "otId": otId}
+    if ivs is None:
+        if limit is None:
+            raise ValueError("Searching without IVs matches millions of spreads, a limit is needed")
+        results = []
+        for personality in searchPersonalities(nature, gender, genderRatio, shiny, otId):
+            for seed in method1Seeds(personality):
+                results.append(spread(seed, personality, method1FromSeed(seed)["ivWord"], otId, genderRatio))
+                if limit is not None and len(results) >= limit:
+                    return results
+        return results
+
+    # The search walks 2^17 states per candidate half, so it starts from the half with the fewest candidates
+    firstHalves, secondHalves = ivHalves(ivs)
+    second = len(secondHalves) < len(firstHalves)
+    halves, otherHalves = (secondHalves, firstHalves) if second else (firstHalves, secondHalves)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(halves) == 1:
+        results = searchHalves(halves, otherHalves, constraints, second, limit)
+    else:
+        chunks = [halves[k::workers] for k in range(workers) if halves[k::workers]]
+        n = len(chunks)
+        with ProcessPoolExecutor(max_workers=n) as pool:
+            results = [result for chunk in pool.map(searchHalves, chunks, [otherHalves] * n, [constraints] * n, [second] * n, [limit] * n) for result in chunk]
+    results.sort(key=lambda result: result["seed"])
+    return results[:limit] if limit is not None else results
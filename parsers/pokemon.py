@@ -0,0 +1,384 @@
+import struct
+from bisect import bisect_right
+from . import utils
+from .checksum import pokemonChecksum, updatePokemonChecksum
+from .profiling import metrics
+from structures.records import Pokemon, IVs, Stats
+from structures.saves import layouts_dict
+
+# More complete information on how pokemon are structured can be found at:
+# https://bulbapedia.bulbagarden.net/wiki/Pok%C3%A9mon_data_structure_(Generation_III)
+
+natures = ["Hardy", "Lonely", "Brave", "Adamant", "Naughty", "Bold", "Docile", "Relaxed", "Impish", "Lax", "Timid", "Hasty", "Serious", "Jolly", "Naive", "Modest", "Mild", "Quiet", "Bashful", "Rash", "Calm", "Gentle", "Sassy", "Careful", "Quirky"]
+
+#When a pokemons data is saved, it's encrypted in one of 24 orders. We need to run a modulo against this list to get the order we need to interpret bytes.
+#Sources:https://bulbapedia.bulbagarden.net/wiki/Pok%C3%A9mon_data_substructures_(Generation_III), https://github.com/ads04r/Gen3Save/blob/master/pokemondata/Gen3Pokemon.py
+orders = ['GAEM', 'GAME', 'GEAM', 'GEMA', 'GMAE', 'GMEA', 'AGEM', 'AGME', 'AEGM', 'AEMG', 'AMGE', 'AMEG', 'EGAM', 'EGMA', 'EAGM', 'EAMG', 'EMGA', 'EMAG', 'MGAE', 'MGEA', 'MAGE', 'MAEG', 'MEGA', 'MEAG']
+# For each order, the byte offset of the G, A, E and M substructures inside the 48 bytes encrypted block
+substruct_offsets = [tuple(12 * order.index(s) for s in 'GAEM') for order in orders]
+
+# The layouts used when none are given, the save's fields are described in structures/saves.py
+default_layouts = layouts_dict["expansion"]["1.8.0"]
+box_pokemon_struct_size = default_layouts["box_pokemon"].size
+pokemon_struct_size = default_layouts["pokemon"].size # A party pokemon is a box pokemon followed by its level and battle stats
+encrypted_block_offset = 32
+encrypted_block_size = default_layouts["substructs"].size
+
+# Experience needed to reach each level (index 0 to 100) for each growth rate, in the order of the GROWTH_* constants
+def _expCurve(formula):
+    return [0, 0] + [max(0, int(formula(n))) for n in range(2, 101)]
+
+def _erratic(n):
+    if n <= 50:
+        return (n**3 * (100 - n)) // 50
+    if n <= 68:
+        return (n**3 * (150 - n)) // 100
+    if n <= 98:
+        return (n**3 * ((1911 - 10 * n) // 3)) // 500
+    return (n**3 * (160 - n)) // 100
+
+def _fluctuating(n):
+    if n <= 15:
+        return (n**3 * ((n + 1) // 3 + 24)) // 50
+    if n <= 36:
+        return (n**3 * (n + 14)) // 50
+    return (n**3 * ((n // 2) + 32)) // 50
+
+experience_tables = [
+    _expCurve(lambda n: n**3),                                          # GROWTH_MEDIUM_FAST
+    _expCurve(_erratic),                                                # GROWTH_ERRATIC
+    _expCurve(_fluctuating),                                            # GROWTH_FLUCTUATING
+    _expCurve(lambda n: (6 * n**3) // 5 - 15 * n**2 + 100 * n - 140),   # GROWTH_MEDIUM_SLOW
+    _expCurve(lambda n: (4 * n**3) // 5),                               # GROWTH_FAST
+    _expCurve(lambda n: (5 * n**3) // 4),                               # GROWTH_SLOW
+]
+
+def levelFromExp(exp: int, growthRate: int) -> int:
+    if growthRate >= len(experience_tables):
+        growthRate = 0
+    return min(100, max(1, bisect_right(experience_tables[growthRate], exp) - 1))
+
+def natureModifiers(nature: int) -> tuple:
+    # The multiplier (in tenths) of the attack, defense, speed, special attack and special defense a nature gives
+    modifiers = [10] * 5
+    if nature // 5 != nature % 5:
+        modifiers[nature // 5] = 11
+        modifiers[nature % 5] = 9
+    return tuple(modifiers)
+
+# For each of the attack, defense, speed, special attack and special defense, its multiplier for each nature
+nature_modifiers = [tuple(natureModifiers(nature)[k] for nature in range(25)) for k in range(5)]
+
+def calcStats(baseStats, ivs, evs, level: int, nature: int) -> tuple:
+    # The stats a pokemon has in battle, in the order of the party pokemon's stats (hp, atk, def, spe, spa, spd).
+    # baseStats, ivs and evs are given in that order as well
+    columns = calcStatsBatch([[stat] for stat in baseStats], [[iv] for iv in ivs], [[ev] for ev in evs], [level], [nature])
+    return tuple(column[0] for column in columns)
+
+def calcStatsBatch(baseStats: list, ivs: list, evs: list, levels, natures) -> list:
+    # The stats of many pokemon at once, computed column by column: baseStats, ivs and evs hold one sequence per stat
+    # (hp, atk, def, spe, spa, spd), and the k-th value of every sequence is about the k-th pokemon.
+    # Returns one list per stat, in the same order.
+    base, iv, ev = baseStats[0], ivs[0], evs[0]
+    columns = [[
+        # Shedinja, the only species with a base HP of 1, always has 1 HP
+        1 if b == 1 else (2*b + i + e//4) * l // 100 + l + 10
+        for b, i, e, l in zip(base, iv, ev, levels)
+    ]]
+    for k in range(1, 6):
+        modifiers = nature_modifiers[k-1]
+        columns.append([
+            ((2*b + i + e//4) * l // 100 + 5) * modifiers[n] // 10
+            for b, i, e, l, n in zip(baseStats[k], ivs[k], evs[k], levels, natures)
+        ])
+    return columns
+
+species_stats = ('hp', 'attack', 'defense', 'speed', 'spattack', 'spdefense')
+
+def pokemonStats(pokemon: list, rom: dict) -> list:
+    # Computes the stats of decoded pokemon, which can come from many saves made on the same rom, in one batch.
+    # Returns a Stats record for each of them.
+    if not pokemon:
+        return []
+    species = rom['species']
+    ids = [mon['speciesId'] for mon in pokemon]
+    if hasattr(species, 'column'):
+        baseStats = [[column[i] for i in ids] for column in (species.column(stat) for stat in species_stats)]
+    else:
+        records = [species[i]['stats'] for i in ids]
+        baseStats = [[record[stat] for record in records] for stat in species_stats]
+    ivs = [[mon['Ivs'][key] for mon in pokemon] for key in ('hp', 'attack', 'defence', 'speed', 'spatk', 'spdef')]
+    evs = [[mon[key] for mon in pokemon] for key in ('EvHp', 'EvAtk', 'EvDef', 'EvSpe', 'EvSpA', 'EvSpD')]
+    levels = [mon['Level'] for mon in pokemon]
+    natures = [mon['personality'] % 25 for mon in pokemon]
+    columns = calcStatsBatch(baseStats, ivs, evs, levels, natures)
+    return [Stats(**dict(zip(species_stats, values))) for values in zip(*columns)]
+
+gender_male = 0
+gender_female = 254
+gender_genderless = 255
+
+def getGender(personality: int, genderRatio: int) -> str:
+    # Like the game, a pokemon is female when its species' gender ratio is above the personality's low byte
+    if genderRatio == gender_genderless:
+        return ""
+    if genderRatio == gender_male:
+        return "(M)"
+    if genderRatio == gender_female or genderRatio > (personality & 0xFF):
+        return "(F)"
+    return "(M)"
+
+def isOccupied(record) -> bool:
+    # Byte 19 holds the isBadEgg, hasSpecies and isEgg flags
+    return bool(record[19] & 0x02)
+
+def decryptSubstructs(records: list) -> list:
+    # Decrypts the 48 bytes block of every given pokemon at once, and returns them with their substructures
+    # put back in the G A E M order.
+    # The block is XORed with (personality ^ OT id), repeated as many times as needed. Instead of doing it 4 bytes at
+    # a time, the blocks of all pokemon are joined into a single integer and XORed with the joined keys in one operation.
+    if not records:
+        return []
+    personalities = []
+    keys = []
+    for record in records:
+        personality, otId = struct.unpack_from('<II', record)
+        personalities.append(personality)
+        keys.append((personality ^ otId).to_bytes(4, 'little') * (encrypted_block_size // 4))
+    encrypted = b''.join(bytes(record[encrypted_block_offset : encrypted_block_offset + encrypted_block_size]) for record in records)
+    decrypted = (int.from_bytes(encrypted, 'little') ^ int.from_bytes(b''.join(keys), 'little')).to_bytes(len(encrypted), 'little')
+
+    blocks = []
+    for k, personality in enumerate(personalities):
+        base = k * encrypted_block_size
+        g, a, e, m = substruct_offsets[personality % 24]
+        blocks.append(decrypted[base+g:base+g+12] + decrypted[base+a:base+a+12] + decrypted[base+e:base+e+12] + decrypted[base+m:base+m+12])
+    return blocks
+
+def decodePokemon(record, substructs: bytes, rom: dict, layouts: dict = default_layouts) -> Pokemon:
+    # record is the raw (still encrypted) box or party pokemon, substructs its decrypted G A E M substructures.
+    # Each of them is unpacked in one go with its layout.
+    pokemon = Pokemon()
+
+    party = len(record) >= layouts['pokemon'].size
+    fields = (layouts['pokemon'] if party else layouts['box_pokemon']).unpack(record)
+    growth = layouts['substructs'].unpack(substructs)
+    personality, otId = fields['personality'], fields['otId']
+
+    pokemon["nickname"] = utils.readstring(fields['nickname']).strip()
+
+    pokemon["checksum"] = fields['checksum']
+    pokemon["checksumValid"] = pokemon["checksum"] == pokemonChecksum(substructs)
+
+    speciesId, heldItemId, exp = growth['species'], growth['heldItem'], growth['experience']
+    moveIds = growth['moves']
+    species = rom['species'][speciesId]
+    pokemon['species'] = species['name'].upper()
+
+    if party:
+        pokemon["Level"] = fields['level']
+    else:
+        # Box pokemon don't store their level, the game computes it from their experience
+        pokemon["Level"] = levelFromExp(exp, species.get('growthRate', 0))
+
+    pokemon['exp'] = exp
+    if heldItemId == 0:
+        pokemon['item'] = 'NONE'
+    else:
+        pokemon['item'] = rom['items'][heldItemId]['name']
+
+    pokemon['moves'] = [rom['movesNames'][moveId] for moveId in moveIds]
+
+    evs = growth['evs']
+    pokemon['EvHp'] = evs[0]
+    pokemon['EvAtk'] = evs[1]
+    pokemon['EvDef'] = evs[2]
+    pokemon['EvSpe'] = evs[3]
+    pokemon['EvSpA'] = evs[4]
+    pokemon['EvSpD'] = evs[5]
+
+    pokemon['Nature'] = natures[personality % 25]
+
+    pokemon['Ivs'] = getivs(growth['ivWord'])
+
+    abilitiesIds = species['abilities']
+    abilityId = abilitiesIds[pokemon['Ivs']['AbilityFlag']]
+    pokemon['Ability'] = rom['abilities'][abilityId]['name']
+
+    pokemon['Gender'] = getGender(personality, species['genderRatio'][0])
+
+    # The ids and raw data below are what encodePokemonBatch writes back, the names above are only for display
+    pokemon['personality'] = personality
+    pokemon['otId'] = otId
+    pokemon['speciesId'] = speciesId
+    pokemon['itemId'] = heldItemId
+    pokemon['moveIds'] = list(moveIds)
+    pokemon['raw'] = bytes(record)
+    pokemon['substructs'] = bytes(substructs)
+
+    return pokemon
+
+def decodePokemonBatch(records: list, rom: dict, layouts: dict = default_layouts) -> list:
+    with metrics.phase('decryptPokemon'):
+        blocks = decryptSubstructs(records)
+    metrics.count('pokemon.decoded', len(records))
+    pokemon = [decodePokemon(record, substructs, rom, layouts) for record, substructs in zip(records, blocks)]
+    with metrics.phase('calcStats'):
+        for mon, stats in zip(pokemon, pokemonStats(pokemon, rom)):
+            mon['Stats'] = stats
+    return pokemon
+
+def encryptSubstructs(pokemon: list) -> list:
+    # The reverse of decryptSubstructs: takes (personality, otId, G A E M substructures) tuples and returns
+    # each 48 bytes block shuffled in its personality's order and encrypted, all the XORs being done at once.
+    if not pokemon:
+        return []
+    shuffled = []
+    keys = []
+    for personality, otId, substructs in pokemon:
+        order = orders[personality % 24]
+        shuffled.append(b''.join(substructs[12*'GAEM'.index(s) : 12*'GAEM'.index(s)+12] for s in order))
+        keys.append((personality ^ otId).to_bytes(4, 'little') * (encrypted_block_size // 4))
+    plain = b''.join(shuffled)
+    encrypted = (int.from_bytes(plain, 'little') ^ int.from_bytes(b''.join(keys), 'little')).to_bytes(len(plain), 'little')
+    return [encrypted[k*encrypted_block_size : (k+1)*encrypted_block_size] for k in range(len(pokemon))]
+
+def setivs(ivs: dict, value: int = 0) -> int:
+    # Puts the IVs and ability flag back in the IV word, keeping the bit getivs doesn't read
+    value &= 0x80000000
+    for shift, key in ((0, 'hp'), (5, 'attack'), (10, 'defence'), (15, 'speed'), (20, 'spatk'), (25, 'spdef')):
+        value |= (ivs[key] & 0x1F) << shift
+    return value | ((ivs['AbilityFlag'] & 1) << 30)
+
+# The origins word of the miscellaneous substructure: met level (bits 0-6), game (7-10), ball (11-14), OT gender (15)
+origins_game_emerald = 3
+origins_poke_ball = 4
+met_location_fateful_encounter = 0xFF
+default_friendship = 70 # When the species doesn't give one
+
+def movePP(moveId: int, ppBonus: int, rom: dict) -> int:
+    # A move's max PP, each PP Up adding a fifth of its base PP
+    if not moveId or 'moves' not in rom or moveId >= len(rom['moves']):
+        return 0
+    basePP = rom['moves'][moveId]['pp']
+    return basePP + basePP * ppBonus // 5
+
+def buildPokemon(pokemon: dict, rom: dict, size: int, layouts: dict = default_layouts):
+    # Applies the editable fields of a decoded (or new) pokemon onto its original record and decrypted substructures.
+    # Returns the record (still holding the old encrypted block) and the new substructures, both as bytearrays.
+    # The species, item and moves are written from their ids. Editing the level also sets the experience, and the
+    # battle stats of party records are computed again. Moves that changed get their full PP, without PP Ups.
+    # New pokemon (without substructures yet) get their species' base friendship, and are met in a Poke Ball.
+    box, party, growth = layouts['box_pokemon'], layouts['pokemon'], layouts['substructs']
+    original = pokemon.get('raw')
+    record = bytearray((original or bytes(size))[:size])
+    if len(record) < size:
+        record += bytes(size - len(record))
+    new = not pokemon.get('substructs')
+    substructs = bytearray(pokemon.get('substructs') or bytes(growth.size))
+    if not original:
+        box.set(record, 'language', 2) # English
+        box.set(record, 'flags', 0x02) # hasSpecies
+
+    box.set(record, 'personality', pokemon['personality'])
+    box.set(record, 'otId', pokemon['otId'])
+    if not original or utils.readstring(box.get(original, 'nickname')) != pokemon['nickname']:
+        box.set(record, 'nickname', utils.writestring(pokemon['nickname'], 10))
+
+    species = rom['species'][pokemon['speciesId']]
+    growthRate = min(species.get('growthRate', 0), len(experience_tables) - 1)
+    exp = pokemon.get('exp', 0)
+    level = pokemon.get('Level')
+    if original and len(original) >= party.size:
+        original_level = party.get(original, 'level')
+    else:
+        original_level = levelFromExp(growth.get(substructs, 'experience'), growthRate) if original else None
+    if level is not None and level != original_level:
+        exp = experience_tables[growthRate][level]
+        pokemon['exp'] = exp
+
+    growth.set(substructs, 'species', pokemon['speciesId'])
+    growth.set(substructs, 'heldItem', pokemon['itemId'])
+    growth.set(substructs, 'experience', exp)
+    oldMoves = growth.get(substructs, 'moves')
+    if tuple(oldMoves) != tuple(pokemon['moveIds']):
+        pp = list(growth.get(substructs, 'pp'))
+        ppBonuses = growth.get(substructs, 'ppBonuses')
+        for k, (oldMove, moveId) in enumerate(zip(oldMoves, pokemon['moveIds'])):
+            if oldMove != moveId:
+                ppBonuses &= ~(3 << 2*k) & 0xFF
+                pp[k] = movePP(moveId, 0, rom)
+        growth.set(substructs, 'pp', pp)
+        growth.set(substructs, 'ppBonuses', ppBonuses)
+    growth.set(substructs, 'moves', pokemon['moveIds'])
+    if new:
+        growth.set(substructs, 'friendship', species.get('friendship', default_friendship))
+        growth.set(substructs, 'metLocation', met_location_fateful_encounter)
+        metLevel = min(level if level is not None else levelFromExp(exp, growthRate), 100)
+        growth.set(substructs, 'origins', metLevel | (origins_game_emerald << 7) | (origins_poke_ball << 11))
+    growth.set(substructs, 'evs', (pokemon['EvHp'], pokemon['EvAtk'], pokemon['EvDef'], pokemon['EvSpe'], pokemon['EvSpA'], pokemon['EvSpD']))
+    growth.set(substructs, 'ivWord', setivs(pokemon['Ivs'], growth.get(substructs, 'ivWord')))
+
+    if size >= party.size:
+        # The party record also holds the level and battle stats, which follow from the fields above
+        if level is None:
+            level = levelFromExp(exp, growthRate)
+        party.set(record, 'level', level)
+        stats = species['stats']
+        baseStats = (stats['hp'], stats['attack'], stats['defense'], stats['speed'], stats['spattack'], stats['spdefense'])
+        ivs = pokemon['Ivs']
+        battleStats = calcStats(baseStats,
+            (ivs['hp'], ivs['attack'], ivs['defence'], ivs['speed'], ivs['spatk'], ivs['spdef']),
+            (pokemon['EvHp'], pokemon['EvAtk'], pokemon['EvDef'], pokemon['EvSpe'], pokemon['EvSpA'], pokemon['EvSpD']),
+            level, pokemon['personality'] % 25)
+        # Like the game, a change of max HP is applied to the current HP, unless the pokemon fainted
+        maxHp = battleStats[0]
+        oldMaxHp = party.get(record, 'stats')[0] if original and len(original) >= party.size else 0
+        hp = party.get(record, 'hp')
+        if not oldMaxHp:
+            # A new pokemon, or a box pokemon put in the party
+            hp = maxHp
+        elif hp:
+            hp = max(1, hp + maxHp - oldMaxHp)
+        party.set(record, 'hp', min(hp, maxHp))
+        party.set(record, 'stats', battleStats)
+        pokemon['Stats'] = Stats(**dict(zip(species_stats, battleStats)))
+    return record, substructs
+
+def encodePokemonBatch(pokemon: list, rom: dict, size: int, layouts: dict = default_layouts) -> list:
+    # Encodes the given pokemon back into records of size bytes. Pokemon whose data didn't change keep their
+    # original record, only the edited ones are checksummed and encrypted again (in a single batch).
+    # Returns a list of (record, changed) tuples.
+    box_size = layouts['box_pokemon'].size
+    results = []
+    edited = []
+    for mon in pokemon:
+        record, substructs = buildPokemon(mon, rom, size, layouts)
+        original = mon.get('raw')
+        if original and len(original) >= size and bytes(substructs) == mon.get('substructs') and record[:encrypted_block_offset] == original[:encrypted_block_offset] and record[box_size:] == original[box_size:size]:
+            results.append((original[:size], False))
+        else:
+            updatePokemonChecksum(record, substructs)
+            results.append((record, True))
+            edited.append((len(results) - 1, mon, record, substructs))
+
+    encrypted = encryptSubstructs([(mon['personality'], mon['otId'], substructs) for _, mon, _, substructs in edited])
+    for (k, mon, record, substructs), block in zip(edited, encrypted):
+        record[encrypted_block_offset : encrypted_block_offset + encrypted_block_size] = block
+        mon['raw'] = bytes(record)
+        mon['substructs'] = bytes(substructs)
+        mon['checksum'] = layouts['box_pokemon'].get(record, 'checksum')
+        mon['checksumValid'] = True
+    return results
+
+def getivs(value) -> IVs:
+    # Each IV is 5 bits long, starting from the least significant bit
+    return IVs(
+        hp=value & 0x1F,
+        attack=(value >> 5) & 0x1F,
+        defence=(value >> 10) & 0x1F,
+        speed=(value >> 15) & 0x1F,
+        spatk=(value >> 20) & 0x1F,
+        spdef=(value >> 25) & 0x1F,
+        AbilityFlag=(value >> 30) & 1,
+    )
@@ -0,0 +1,127 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+from contextlib import nullcontext
+
+# Opt-in instrumentation of the parsers: per-phase timers, counters (records decoded, bytes read, cache hits...)
+# and cProfile hooks on chosen phases.
+# It is disabled by default, in which case phase() hands back a shared no-op context manager and count() returns
+# right away, so the parsers can stay instrumented at next to no cost.
+#
+#   from parsers.profiling import metrics
+#   metrics.enable(profile=['process'])
+#   ... parse things ...
+#   print(metrics.toJSON())
+#   print(metrics.profileReport('process'))
+
+_disabled_phase = nullcontext()
+
+class Phase:
+    __slots__ = ('metrics', 'name', 'start', 'profiler', 'nested')
+
+    def __init__(self, metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+        self.profiler = None
+        self.nested = [] # The profilers of the profiled phases run inside this one
+
+    def __enter__(self):
+        if self.name in self.metrics.profiled:
+            # Only one profiler can be active at a time: the one of an enclosing profiled phase is paused until
+            # this phase ends, and this phase's calls are added to its stats
+            active = self.metrics.profiling
+            if active:
+                active[-1].profiler.disable()
+            self.profiler = cProfile.Profile()
+            active.append(self)
+            self.profiler.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        if self.profiler is not None:
+            self.profiler.disable()
+            active = self.metrics.profiling
+            active.pop()
+            for profiler in [self.profiler] + self.nested:
+                self.metrics.addProfile(self.name, profiler)
+            if active:
+                active[-1].nested += [self.profiler] + self.nested
+                active[-1].profiler.enable()
+        self.metrics.addTiming(self.name, elapsed)
+        return False
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.profiled = set()
+        self.profiling = [] # The profiled phases currently running, innermost last
+        self.reset()
+
+    def enable(self, profile=()):
+        # profile lists the phases to run under cProfile
+        self.enabled = True
+        self.profiled = set(profile)
+
+    def disable(self):
+        self.enabled = False
+        self.profiled = set()
+
+    def reset(self):
+        self.timings = {}
+        self.counters = {}
+        self.values = {}
+        self.profiles = {}
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _disabled_phase
+        return Phase(self, name)
+
+    def count(self, name: str, amount: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name: str, value):
+        # Keeps the last value of something worth knowing about a run, e.g. the selected save slot
+        if self.enabled:
+            self.values[name] = value
+
+    def addTiming(self, name: str, elapsed: float):
+        timing = self.timings.get(name)
+        if timing is None:
+            self.timings[name] = {'calls': 1, 'total': elapsed, 'max': elapsed}
+        else:
+            timing['calls'] += 1
+            timing['total'] += elapsed
+            timing['max'] = max(timing['max'], elapsed)
+
+    def addProfile(self, name: str, profiler: cProfile.Profile):
+        if name in self.profiles:
+            self.profiles[name].add(profiler)
+        else:
+            self.profiles[name] = pstats.Stats(profiler)
+
+    def profileReport(self, name: str, limit: int = 20, sort: str = 'cumulative') -> str:
+        if name not in self.profiles:
+            return ""
+        output = io.StringIO()
+        self.profiles[name].stream = output
+        self.profiles[name].sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def asDict(self) -> dict:
+        return {
+            'timings': {name: dict(timing) for name, timing in self.timings.items()},
+            'counters': dict(self.counters),
+            'values': dict(self.values),
+            'profiled': sorted(self.profiles),
+        }
+
+    def toJSON(self, **kwargs) -> str:
+        return json.dumps(self.asDict(), default=str, **kwargs)
+
+metrics = Metrics()
@@ -0,0 +1,106 @@
+import sys
+from array import array
+from structures.bitset import Bitset
+from structures.saves import section_data_size
+
+# Reads the event flags, vars and pokedex of a save, where the rom header says they are.
+# Flags and vars live in SaveBlock1, which is split over sections 1 to 4, and the pokedex in SaveBlock2 (section 0):
+#   struct Pokedex { u8 order, mode, nationalMagic, unknown2; u32 unownPersonality, spindaPersonality, unknown3;
+#                    u8 owned[DEX_FLAGS_NO]; u8 seen[DEX_FLAGS_NO]; }
+# Vanilla emerald also keeps two copies of seen in SaveBlock1 (seen1Offset and seen2Offset), which the game
+# compares to the one of SaveBlock2, so they are written back along with it.
+# Flags are Bitsets indexed by flag id, vars an array('H') indexed by var id - 0x4000, and the pokedex Bitsets are
+# indexed by national dex number - 1.
+#
+#   save["pokedex"]["owned"].count()
+#   save["flags"].count(0x500, 0x600)
+#   save["vars"][0x40D3 - vars_start]
+
+vars_start = 0x4000
+pokedex_header_size = 0x10
+
+def dexFlagsSize(pokedexCount: int) -> int:
+    # DEX_FLAGS_NO, the size of the owned and seen arrays: enough bytes for every dex number, rounded to words
+    return ((pokedexCount + 7) // 8 + 3) & ~3
+
+def readSaveBlock1(sections: list, sizes: list) -> bytes:
+    return b''.join(bytes(sections[i]["rawData"][:sizes[i]]) for i in range(1, 5))
+
+def saveBlock1Chunks(offset: int, size: int) -> list:
+    # Where size bytes at offset in SaveBlock1 are stored, as (section id, offset in the section, offset in the
+    # bytes, length) chunks, as they can straddle two sections
+    chunks = []
+    end = offset + size
+    while offset < end:
+        section_id, section_offset = 1 + offset // section_data_size, offset % section_data_size
+        length = min(end - offset, section_data_size - section_offset)
+        chunks.append((section_id, section_offset, size - (end - offset), length))
+        offset += length
+    return chunks
+
+def flagsBounds(header: dict, offsets: dict) -> tuple:
+    # The flags' offset in SaveBlock1 and size in bytes. The header doesn't give the size, but vars follow
+    # flags in SaveBlock1, so it can be told from their offsets
+    size = header["varsOffset"] - header["flagsOffset"]
+    if not 0 < size <= 0x1000:
+        size = offsets["flags_size"]
+    return header["flagsOffset"], size
+
+def readFlags(block1: bytes, header: dict, offsets: dict) -> Bitset:
+    offset, size = flagsBounds(header, offsets)
+    return Bitset(block1[offset:offset+size])
+
+def readVars(block1: bytes, header: dict, offsets: dict) -> array:
+    offset = header["varsOffset"]
+    vars = array('H', block1[offset : offset + offsets["vars_count"]*2])
+    if sys.byteorder != 'little':
+        vars.byteswap()
+    return vars
+
+def readPokedex(block2, header: dict) -> dict:
+    size = dexFlagsSize(header["pokedexCount"])
+    owned = header["pokedexOffset"] + pokedex_header_size
+    return {
+        "owned": Bitset(block2[owned:owned+size], header["pokedexCount"]),
+        "seen": Bitset(block2[owned+size:owned+2*size], header["pokedexCount"]),
+    }
+
+def readProgress(sections: list, header: dict, offsets: dict, sizes: list) -> dict:
+    # The flags, vars and pokedex of a save, None for those the rom header doesn't locate (e.g. a zeroed header)
+    progress = {"flags": None, "vars": None, "pokedex": None}
+    if not header:
+        return progress
+    if header.get("flagsOffset") or header.get("varsOffset"):
+        block1 = readSaveBlock1(sections, sizes)
+        if header["flagsOffset"]:
+            progress["flags"] = readFlags(block1, header, offsets)
+        if header["varsOffset"]:
+            progress["vars"] = readVars(block1, header, offsets)
+    if header.get("pokedexOffset") and header.get("pokedexCount"):
+        progress["pokedex"] = readPokedex(sections[0]["rawData"], header)
+    return progress
+
+def encodeProgress(save: dict, header: dict) -> list:
+    # The (section id, offset in the section, data) patches writing a save's flags, vars and pokedex back
+    patches = []
+
+    def block1(offset: int, data: bytes):
+        for section_id, section_offset, start, length in saveBlock1Chunks(offset, len(data)):
+            patches.append((section_id, section_offset, data[start:start+length]))
+
+    if save.get("flags") is not None:
+        block1(header["flagsOffset"], bytes(save["flags"]))
+    if save.get("vars") is not None:
+        vars = array('H', save["vars"])
+        if sys.byteorder != 'little':
+            vars.byteswap()
+        block1(header["varsOffset"], vars.tobytes())
+    if save.get("pokedex") is not None:
+        owned = header["pokedexOffset"] + pokedex_header_size
+        seen = bytes(save["pokedex"]["seen"])
+        patches.append((0, owned, bytes(save["pokedex"]["owned"])))
+        patches.append((0, owned + len(seen), seen))
+        for copy in ("seen1Offset", "seen2Offset"):
+            if header.get(copy):
+                block1(header[copy], seen)
+    return patches
@@ -1,31 +1,79 @@
+import mmap
 from .versions import versions_parsers
 from . import utils
+from . import cache
+from .profiling import metrics
+
+def parseRom(path: str, lazy: bool = False, cache_dir: str = None):
+    # With lazy=True, the rom is memory-mapped instead of being read in memory, and the species,
+    # moves, items and abilities tables are only decoded record by record when they are accessed.
+    # The mapping stays open for as long as the returned tables are alive.
+    # With a cache_dir, the parsed database is loaded from (or stored to) a snapshot keyed by the rom's
+    # content hash, in which case every table is fully decoded and lazy is ignored.
+    if cache_dir is not None:
+        return parseRomCached(path, cache_dir)
+
+    with metrics.phase('readRomFile'), open(path, 'rb') as f:
+        if lazy:
+            rom = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            rom = f.read()
+            metrics.count('bytes.rom', len(rom))
+    return readRom(rom, lazy)
+
+def parseRomCached(path: str, cache_dir: str):
+    with metrics.phase('hashRom'):
+        rom_hash = cache.hashRom(path)
+    with metrics.phase('loadSnapshot'):
+        snapshot = cache.loadSnapshot(cache_dir, rom_hash)
+    if snapshot is not None:
+        expansionVersion = snapshot['rom']['expansionVersion']
+        if expansionVersion in versions_parsers and snapshot['key'] == cache.cacheKey(expansionVersion, versions_parsers[expansionVersion].parser_version):
+            metrics.count('cache.hits')
+            return snapshot['rom']
+    metrics.count('cache.misses')
 
-def parseRom(path: str):
     with open(path, 'rb') as f:
-        rom = f.read()
-
-        expansionVersion = utils.getExpansionVersion(rom)
-        expansionVersion = "1.8.0" # TEMPORARY DEV OVERRIDE
-        if not expansionVersion >= minimum_expansion_version:
-            raise ValueError(f"Your rom is using expansion version {expansionVersion}, which is older than minimum supported version {minimum_expansion_version}")
-
-        header_info = versions_parsers[expansionVersion].readRomHeader(rom)
-        # for k in header_info.keys():
-        #    print(f"{k}: \"{header_info[k]}\"")
-
-        species = versions_parsers[expansionVersion].readSpecies(rom, header_info)
-        moves = versions_parsers[expansionVersion].readMoves(rom, header_info)
-        items = versions_parsers[expansionVersion].readItems(rom, header_info)
-        abilities = versions_parsers[expansionVersion].readAbilities(rom, header_info)
-
-        return {
-            'expansionVersion': expansionVersion,
-            'header': header_info,
-            'species': species,
-            'movesNames': moves,
-            'items': items,
-            'abilities': abilities,
-        }
+        data = f.read()
+    metrics.count('bytes.rom', len(data))
+    rom = readRom(data, False)
+    key = cache.cacheKey(rom['expansionVersion'], versions_parsers[rom['expansionVersion']].parser_version)
+    with metrics.phase('saveSnapshot'):
+        cache.saveSnapshot(cache_dir, rom_hash, key, rom)
+    return rom
+
+def readRom(rom, lazy: bool = False):
+    expansionVersion = utils.getExpansionVersion(rom)
+    expansionVersion = "1.8.0" # TEMPORARY DEV OVERRIDE
+    if not expansionVersion >= minimum_expansion_version:
+        raise ValueError(f"Your rom is using expansion version {expansionVersion}, which is older than minimum supported version {minimum_expansion_version}")
+
+    parser = versions_parsers[expansionVersion]
+    with metrics.phase('readRomHeader'):
+        header_info = parser.readRomHeader(rom)
+    with metrics.phase('detectTables'):
+        header_info['tableCounts'] = parser.detectTableCounts(rom, header_info)
+    with metrics.phase('readSpecies'):
+        species = parser.readSpecies(rom, header_info, lazy)
+    with metrics.phase('readMoves'):
+        moves = parser.readMoves(rom, header_info, lazy)
+    with metrics.phase('readMoveData'):
+        moveData = parser.readMoveData(rom, header_info, lazy)
+    with metrics.phase('readItems'):
+        items = parser.readItems(rom, header_info, lazy)
+    with metrics.phase('readAbilities'):
+        abilities = parser.readAbilities(rom, header_info, lazy)
+    if not lazy:
+        metrics.count('records.decoded', len(species) + len(moves) + len(moveData) + len(items) + len(abilities))
+
+    return {
+        'expansionVersion': expansionVersion,
+        'header': header_info,
+        'species': species,
+        'movesNames': moves,
+        'moves': moveData,
+        'items': items,
+        'abilities': abilities,
+    }
 
 minimum_expansion_version = "1.7.1"
@@ -1,46 +1,134 @@
 import struct
 from . import utils
-from structures.saves import offsets_dict, gamedata_dict
-from operator import xor
+from . import checksum
+from .profiling import metrics
+from .pokemon import decodePokemonBatch, isOccupied, default_layouts
+from .progress import readProgress
+from .bag import readSaveBag
+from structures.saves import offsets_dict, gamedata_dict, layouts_dict, section_data_size, pc_sections
 
 # More complete information on how the save data is structured can be found at:
 # https://bulbapedia.bulbagarden.net/wiki/Save_data_structure_(Generation_III)
 
-def getSaveInfo(data) -> dict:
+footer_struct = struct.Struct('<HHII')
+playtime_struct = struct.Struct('<HBBB')
+
+def getSaveInfo(data, sizes: list = checksum.section_sizes) -> dict:
+    # The sections' data are memoryviews over data, nothing is copied
+    data = memoryview(data)
     save = {
         "sections": [ {} for _ in range(14) ],
-        "slot": None
+        "slot": None,
+        "index": 0,
+        "playtime": 0,
+        "valid": True,
+        "data": data,
     }
 
     for i in range(0, 14):
-        section = {
-            "i": i * 4096 # The byte position of the current section. Each section is 4Kb, so 4096 bytes long
-        }
-        section["rawData"] = data[section["i"]:section["i"]+4096] # The raw data of the section, for further use
-        section["footer"] = section["rawData"][4084:]
-        # The section's data is up to 3968 bytes long (see table below). The end 12 bytes of the section are occupied by footer data.
-        # There are 116 bytes of padding between the section's data and its footer
-        # Footer includes Section ID (2 bytes), Checksum (2 bytes), Signature (4 bytes), Save index (4 bytes)
-        #print(section["footer"])
-
-        section["id"] = struct.unpack('<H', section["footer"][0:2])[0]
-        section["index"] = struct.unpack('<I', section["footer"][4:8])[0]
-        #print(section["id"], section["index"])
-
-        ds = 0
+        section = readSection(data, i, sizes)
+        if section is None or not section["valid"]:
+            save["valid"] = False
+        if section is None:
+            continue
 
         if section["id"] == 0:
-            ds = struct.unpack('<HBBB', section["rawData"][14:19])
+            ds = playtime_struct.unpack_from(section["rawData"], 14)
             dt = (ds[0] * 3600) + (ds[1] * 60) + ds[2]
             save["index"] = section["index"]
             save["playtime"] = dt
 
         save["sections"][section["id"]] = section
 
+    if any(not section for section in save["sections"]):
+        save["valid"] = False
+
     # We return the save's index and the playtime on it
     return save
 
-def getCurrentSave(save_a: dict, save_b: dict):
+def readSection(data, position: int, sizes: list = checksum.section_sizes, valid: bool = None):
+    # The section stored at the given position of a slot, None if it isn't a section of a written save (e.g. an
+    # empty slot). Its checksum is verified, unless its validity is already known
+    section = {
+        "i": position * 4096 # The byte position of the current section. Each section is 4Kb, so 4096 bytes long
+    }
+    section["rawData"] = data[section["i"]:section["i"]+4096] # The raw data of the section, for further use
+    section["footer"] = section["rawData"][4084:]
+    # The section's data is up to 3968 bytes long (see table below). The end 12 bytes of the section are occupied by footer data.
+    # There are 116 bytes of padding between the section's data and its footer
+    # Footer includes Section ID (2 bytes), Checksum (2 bytes), Signature (4 bytes), Save index (4 bytes)
+
+    section["id"], section["checksum"], section["signature"], section["index"] = footer_struct.unpack(section["footer"])
+
+    if section["id"] >= 14 or section["signature"] != checksum.section_signature:
+        return None
+    if valid is None:
+        valid = section["checksum"] == checksum.sectionChecksum(section["rawData"], sizes[section["id"]])
+    section["valid"] = valid
+    return section
+
+def readSlotFooters(data, offset: int) -> dict:
+    # A lighter getSaveInfo, only reading the 12 bytes footers of the slot starting at offset (and the playtime),
+    # to know which slot is the most recent without looking at the rest of the sections.
+    # "valid" is only about the footers here, the checksums are checked once a slot is picked.
+    slot = {
+        "offset": offset,
+        "slot": None,
+        "index": 0,
+        "playtime": 0,
+        "valid": True,
+        "footers": {}, # The (position, checksum, index) of each section, by id
+    }
+    for i in range(14):
+        section_offset = offset + i * 4096
+        section_id, section_checksum, signature, index = footer_struct.unpack_from(data, section_offset + 4084)
+        if section_id >= 14 or signature != checksum.section_signature:
+            slot["valid"] = False
+            continue
+        slot["footers"][section_id] = (i, section_checksum, index)
+        if section_id == 0:
+            ds = playtime_struct.unpack_from(data, section_offset + 14)
+            slot["index"] = index
+            slot["playtime"] = (ds[0] * 3600) + (ds[1] * 60) + ds[2]
+    if len(slot["footers"]) != 14:
+        slot["valid"] = False
+    return slot
+
+def selectSlot(data, offsets: dict, sizes: list = checksum.section_sizes, policy: str = "fallback") -> dict:
+    # Picks the current slot from the footers only, then returns the getSaveInfo of that slot alone.
+    # With the "fallback" policy, the other slot is only looked at if the picked one has a bad checksum.
+    data = memoryview(data)
+    slot_a = readSlotFooters(data, offsets["save_a"][0])
+    slot_b = readSlotFooters(data, offsets["save_b"][0])
+    slot_a["slot"], slot_b["slot"] = "A", "B"
+    candidates = [getCurrentSave(slot_a, slot_b, policy)]
+    if policy == "fallback":
+        other = slot_b if candidates[0] is slot_a else slot_a
+        if other["valid"]:
+            candidates.append(other)
+
+    first = None
+    for candidate in candidates:
+        bounds = offsets["save_a"] if candidate["slot"] == "A" else offsets["save_b"]
+        save = getSaveInfo(data[bounds[0]:bounds[1]], sizes)
+        save["slot"] = candidate["slot"]
+        if save["valid"]:
+            return save
+        if first is None:
+            first = save
+    # If no slot is valid, we keep the first pick, like the "index" policy would
+    return first
+
+def getCurrentSave(save_a: dict, save_b: dict, policy: str = "fallback"):
+    # With the "fallback" policy, a slot with a missing section or a bad checksum is only picked if the other
+    # one is broken as well. With the "index" policy, checksums are ignored, like before they were validated.
+    if policy == "fallback" and save_a["valid"] != save_b["valid"]:
+        save = save_a if save_a["valid"] else save_b
+        save["slot"] = "A" if save_a["valid"] else "B"
+        return save
+    elif policy not in ("fallback", "index"):
+        raise ValueError(f"Unknown slot selection policy {policy}")
+
     save = None
     # We check for the save's index and pick whichever is the greatest
     if save_a["index"] < save_b["index"]:
@@ -76,7 +164,19 @@ def getCurrentSave(save_a: dict, save_b: dict):
 # 11 	3968 	PC buffer G
 # 12 	3968 	PC buffer H
 # 13 	2000 	PC buffer I
+def checkSections(savedata: dict):
+    # A slot missing a section can't be decoded, which happens when neither slot was fully written (or with the
+    # "index" policy, which doesn't look at the sections). Sections with a bad checksum are still decoded.
+    missing = [i for i, section in enumerate(savedata["sections"]) if not section]
+    if missing:
+        corrupt = [i for i, section in enumerate(savedata["sections"]) if section and not section["valid"]]
+        message = f"No usable save slot: slot {savedata['slot']} is missing section(s) {', '.join(map(str, missing))}"
+        if corrupt:
+            message += f", and section(s) {', '.join(map(str, corrupt))} have a bad checksum"
+        raise ValueError(message)
+
 def process(savedata: dict, game_version: str, rom: dict) -> dict:
+    checkSections(savedata)
     save = {
         "name": None,
         "gender": None,
@@ -85,110 +185,87 @@ def process(savedata: dict, game_version: str, rom: dict) -> dict:
     }
     offsets = offsets_dict[game_version][rom["expansionVersion"]]
     gamedata = gamedata_dict[game_version]
+    layouts = layouts_dict[game_version][rom["expansionVersion"]]
+    pokemon_struct_size = layouts["pokemon"].size
 
     sections = savedata["sections"]
+    # Kept so that the save can be written back by writeSave
+    save["slot"] = savedata["slot"]
+    save["index"] = savedata["index"]
+    save["slotData"] = savedata["data"] # A memoryview over the save file
+    save["sectionOffsets"] = [section.get("i") for section in sections]
+
     # Section 0 data
-    save["name"] = utils.readstring(sections[0]["rawData"][0:7]).strip()
-    save["trainer_id"] = int(struct.unpack('<I', sections[0]["rawData"][offsets["trainer_id"][0]:offsets["trainer_id"][1]])[0])
-    save["security_key"] = int(struct.unpack('<I', sections[0]["rawData"][offsets["security_key"][0]:offsets["security_key"][1]])[0])
-    if("gender" in offsets):
-        gender_id = sections[0]["rawData"][offsets["gender"]]
-        save["gender"] = gamedata["genders"][gender_id]
+    save.update(readTrainer(sections[0]["rawData"], offsets, gamedata))
 
 
 
 
     # Section 1 data
-    natures = ["Hardy", "Lonely", "Brave", "Adamant", "Naughty", "Bold", "Docile", "Relaxed", "Impish", "Lax", "Timid", "Hasty", "Serious", "Jolly", "Naive", "Modest", "Mild", "Quiet", "Bashful", "Rash", "Calm", "Gentle", "Sassy", "Careful", "Quirky"]
-
-    #When a pokemons data is saved, it's encrypted in one of 24 orders. We need to run a modulo against this list to get the order we need to interpret bytes.
-    #Sources:https://bulbapedia.bulbagarden.net/wiki/Pok%C3%A9mon_data_substructures_(Generation_III), https://github.com/ads04r/Gen3Save/blob/master/pokemondata/Gen3Pokemon.py
-    orders = ['GAEM', 'GAME', 'GEAM', 'GEMA', 'GMAE', 'GMEA', 'AGEM', 'AGME', 'AEGM', 'AEMG', 'AMGE', 'AMEG', 'EGAM', 'EGMA', 'EAGM', 'EAMG', 'EMGA', 'EMAG', 'MGAE', 'MGEA', 'MAGE', 'MAEG', 'MEGA', 'MEAG']
-
     save["team_count"] = int(struct.unpack('<I', sections[1]["rawData"][offsets["team_count"][0]:offsets["team_count"][1]])[0])
-    for i in range (0, save["team_count"]):
-
-        pokemon = {}
-
-        personality = int(struct.unpack('<I', sections[1]["rawData"][offsets["team_offset"]+((i*100)):offsets["team_offset"]+(4+(i*100))])[0])
-        orderstring = orders[personality % 24]
-        decryptionkey = personality ^ save["trainer_id"]
-
-        pokemon["nickname"] = utils.readstring(sections[1]["rawData"][offsets["team_offset"]+(8+(i*100)):offsets["team_offset"]+(18+(i*100))]).strip()
-
-
-        pokemon["checksum"] = int(struct.unpack('<I', sections[1]["rawData"][offsets["team_offset"]+(28 + (i*100)):offsets["team_offset"]+(32+(i*100))])[0])
-        pokemon["Level"] = int(struct.unpack('<B', sections[1]["rawData"][offsets["team_offset"]+(84 + (i*100)):offsets["team_offset"]+(85+(i*100))])[0])
-
-        substructSections = {}
-        for j in range (0, 4):
-            #Calculation below:
-            #(i * 100) gets current pokemon, 32 is the offset for the 48 bit encrypted block. Blocks are encrypted in 12 byte chuncks, hence 12 * j
-            sectionData = (sections[1]["rawData"][offsets["team_offset"]+(32+(i*100)+(j*12)):offsets["team_offset"]+(32+(i*100)+(j+1)*12)])
-            decryptedValue = decryptSubstruct(sectionData, decryptionkey)
-            substructSections[orderstring[j]] = decryptedValue
-        #print(substructSections[orderstring[j]])
-
-        species = rom['species'][int(struct.unpack('<H', substructSections['G'][0:2])[0])]
-        pokemon['species'] = species['name'].upper()
-        #print(pokemon['species'].upper())
-
-        pokemon['exp'] = int(struct.unpack('<I', substructSections['G'][4:8])[0])
-        heldItemId = int(struct.unpack('<H', substructSections['G'][2:4])[0])
-        if heldItemId == 0:
-            pokemon['item'] = 'NONE'
-        else:
-            pokemon['item'] = rom['items'][heldItemId]['name']
-
-        moves = []
-        for i in range(4):
-            moveId = int(struct.unpack('<H', substructSections['A'][i*2:i*2+2])[0])
-            moves.append(rom['movesNames'][moveId])
-        pokemon['moves'] = moves
-
-        pokemon['EvHp'] = int(struct.unpack('<B', substructSections['E'][0:1])[0])
-        pokemon['EvAtk'] = int(struct.unpack('<B', substructSections['E'][1:2])[0])
-        pokemon['EvDef'] = int(struct.unpack('<B', substructSections['E'][2:3])[0])
-        pokemon['EvSpe'] = int(struct.unpack('<B', substructSections['E'][3:4])[0])
-        pokemon['EvSpA'] = int(struct.unpack('<B', substructSections['E'][4:5])[0])
-        pokemon['EvSpD'] = int(struct.unpack('<B', substructSections['E'][5:6])[0])
-
-        pokemon['Nature'] = natures[personality % 25]
-
-        ''''
-        pokemon['HP'] = int(struct.unpack('<H', sections[1]["rawData"][offsets["team_offset"]+(88 + (i*100)):offsets["team_offset"]+(90 + (i*100))])[0])
-        pokemon['Atk'] = int(struct.unpack('<H', sections[1]["rawData"][offsets["team_offset"]+(90 + (i*100)):offsets["team_offset"]+(92 + (i*100))])[0])
-        pokemon['Def'] = int(struct.unpack('<H', sections[1]["rawData"][offsets["team_offset"]+(92 + (i*100)):offsets["team_offset"]+(94 + (i*100))])[0])
-        pokemon['Spe'] = int(struct.unpack('<H', sections[1]["rawData"][offsets["team_offset"]+(94 + (i*100)):offsets["team_offset"]+(96 + (i*100))])[0])
-        pokemon['SpA'] = int(struct.unpack('<H', sections[1]["rawData"][offsets["team_offset"]+(96 + (i*100)):offsets["team_offset"]+(98 + (i*100))])[0])
-        pokemon['SpD'] = int(struct.unpack('<H', sections[1]["rawData"][offsets["team_offset"]+(98 + (i*100)):offsets["team_offset"]+(100 + (i*100))])[0])
-        '''
-
-        pokemon['Ivs'] = getivs(int(struct.unpack('<I', substructSections['M'][4:8])[0]))
-
-        abilitiesIds = species['abilities']
-        abilityId = abilitiesIds[pokemon['Ivs']['AbilityFlag']]
-        pokemon['Ability'] = rom['abilities'][abilityId]['name']
-        # Only need to translate Abilities from int to strings and we're pretty much done here
-
-        genderRatio = species['genderRatio']
-        genderInteger = int(struct.unpack('<B', sections[1]["rawData"][offsets["team_offset"]+(0+(i*100)):offsets["team_offset"]+(1+(i*100))])[0])
-
-        if len(str(genderRatio)) < 2:
-            pokemon['Gender'] = ""
-        elif genderInteger > (224 * 0.01 * float(genderRatio[0])):
-            pokemon['Gender'] = "(M)"
-        else:
-            pokemon['Gender'] = "(F)"
-
-        save['team'].append(pokemon)
-
-    # Section 2 Data
-
+    team_records = [
+        sections[1]["rawData"][offsets["team_offset"] + i*pokemon_struct_size : offsets["team_offset"] + (i+1)*pokemon_struct_size]
+        for i in range(save["team_count"])
+    ]
+    with metrics.phase('decodeTeam'):
+        save["team"] = decodePokemonBatch(team_records, rom, layouts)
+
+    # Sections 1 to 4 (SaveBlock1) and section 0 data
+    with metrics.phase('readProgress'):
+        save.update(readProgress(sections, rom.get("header"), offsets, checksum.getSectionSizes(rom.get("header"))))
+    with metrics.phase('readBag'):
+        save["bag"] = readSaveBag(sections, rom.get("header"), save["security_key"], rom, checksum.getSectionSizes(rom.get("header")))
+
+    # Sections 5 to 13 data
+    storage = readStorage(sections)
+    save["current_box"] = storage[offsets["pc_current_box"]]
+    with metrics.phase('decodeBoxes'):
+        save["boxes"] = readBoxes(storage, offsets, rom, layouts)
 
     return save
 
-def parseSave(path: str, game_version: str, rom: dict) -> dict:
+def readTrainer(data, offsets: dict, gamedata: dict) -> dict:
+    # The trainer info held by section 0
+    trainer = {}
+    trainer["name"] = utils.readstring(data[0:7]).strip()
+    trainer["trainer_id"] = int(struct.unpack('<I', data[offsets["trainer_id"][0]:offsets["trainer_id"][1]])[0])
+    trainer["security_key"] = int(struct.unpack('<I', data[offsets["security_key"][0]:offsets["security_key"][1]])[0])
+    if("gender" in offsets):
+        gender_id = data[offsets["gender"]]
+        trainer["gender"] = gamedata["genders"][gender_id]
+    return trainer
+
+def readStorage(sections: list) -> bytes:
+    # The PC storage is split over sections 5 to 13, each holding the next 3968 bytes of it
+    return b''.join(bytes(sections[i]["rawData"][:section_data_size]) for i in pc_sections)
+
+def readBoxes(storage: bytes, offsets: dict, rom: dict, layouts: dict = default_layouts) -> list:
+    box_pokemon_struct_size = layouts["box_pokemon"].size
+    box_count = offsets["pc_box_count"]
+    box_size = offsets["pc_box_size"]
+    boxes = []
+    records = []
+    positions = []
+    for box in range(box_count):
+        name_offset = offsets["pc_box_names_offset"] + box*9
+        boxes.append({
+            "name": utils.readstring(storage[name_offset:name_offset+9]),
+            "wallpaper": storage[offsets["pc_box_wallpapers_offset"] + box],
+            "pokemon": [None] * box_size,
+        })
+        for slot in range(box_size):
+            record_offset = offsets["pc_boxes_offset"] + (box*box_size + slot)*box_pokemon_struct_size
+            record = storage[record_offset:record_offset+box_pokemon_struct_size]
+            if isOccupied(record):
+                records.append(record)
+                positions.append((box, slot))
+
+    # Every occupied slot of every box is decrypted in a single batch
+    for (box, slot), pokemon in zip(positions, decodePokemonBatch(records, rom, layouts)):
+        boxes[box]["pokemon"][slot] = pokemon
+    return boxes
+
+def parseSave(path: str, game_version: str, rom: dict, slot_policy: str = "fallback") -> dict:
     if not game_version in offsets_dict:
         print(f"This version ({game_version}) is not supported ! If you are this version's developer, please define its offsets in offsets.py")
         return {}
@@ -197,41 +274,23 @@ def parseSave(path: str, game_version: str, rom: dict) -> dict:
         #return {} # We currently don't return as no release is currently supported
         rom["expansionVersion"] = "1.8.0" # Temporary override as we're developing against upcoming
 
-    offsets = offsets_dict[game_version][rom["expansionVersion"]]
-    print(offsets)
+    with metrics.phase('readSaveFile'):
+        data = utils.byteArrayFromFile(path)
+    return parseSaveData(data, game_version, rom, slot_policy)
 
-    data = utils.byteArrayFromFile(path)
+def parseSaveData(data, game_version: str, rom: dict, slot_policy: str = "fallback") -> dict:
+    # Like parseSave, from the save file's content
+    offsets = offsets_dict[game_version][rom["expansionVersion"]]
+    metrics.count('bytes.save', len(data))
     # There are two save files in gen III
     # The first one goes from 0 to 57344 (not included), the second from 57344 to 114688 (not included).
-    save_a = getSaveInfo(data[offsets["save_a"][0]:offsets["save_a"][1]])
-    save_b = getSaveInfo(data[offsets["save_b"][0]:offsets["save_b"][1]])
+    sizes = checksum.getSectionSizes(rom.get("header"))
+    with metrics.phase('selectSlot'):
+        save = selectSlot(data, offsets, sizes, slot_policy)
+    metrics.record('slot', save['slot'])
+    metrics.record('slotValid', save['valid'])
 
-    save = getCurrentSave(save_a, save_b)
-
-    #print(save)
-    print(f"The current save slot is {save['slot']}")
-
-    processed_data = process(save, game_version, rom)
+    with metrics.phase('process'):
+        processed_data = process(save, game_version, rom)
 
     return processed_data
-
-def getivs(value) -> dict:
-
-    iv = {}
-    bitstring = str(str(bin(value)[2:])[::-1] + '00000000000000000000000000000000')[0:32]
-    iv['hp'] = int(bitstring[0:5], 2)
-    iv['attack'] = int(bitstring[5:10], 2)
-    iv['defence'] = int(bitstring[10:15], 2)
-    iv['speed'] = int(bitstring[15:20], 2)
-    iv['spatk'] = int(bitstring[20:25], 2)
-    iv['spdef'] = int(bitstring[25:30], 2)
-    iv['AbilityFlag'] = int(bitstring[30:31], 2)
-    return iv
-
-def decryptSubstruct(data, key):
-    if len(data) != 12:
-        return []
-    a = xor(struct.unpack('<I', data[0:4])[0], key)
-    b = xor(struct.unpack('<I', data[4:8])[0], key)
-    c = xor(struct.unpack('<I', data[8:12])[0], key)
-    return struct.pack('<III', a, b, c)
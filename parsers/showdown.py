@@ -0,0 +1,210 @@
+import random
+import re
+from . import utils
+from .lookup import nameIndex
+from .personality import searchPersonalities, isShiny
+from .pokemon import natures, experience_tables, default_layouts, getGender, calcStats, species_stats, encodePokemonBatch
+from structures.records import Pokemon, IVs, Stats
+
+# Imports pokemon written in the Showdown (competitive) text format, the reverse of export/competitive.py.
+# Names are resolved with the rom's name indexes, and each pokemon gets a personality value matching its nature and
+# gender. The pokemon returned are new (they have no raw record yet), writeSave or encodeTeams encode them all in a
+# single batch.
+#
+#   teams = importShowdown(text, rom, save["trainer_id"], save["name"])
+#   save["team"] = teams[0]["pokemon"]
+#   writeSave(path, save, "expansion", rom)
+
+stat_names = {'HP': 0, 'Atk': 1, 'Def': 2, 'Spe': 3, 'SpA': 4, 'SpD': 5} # In the order of the party pokemon's stats
+ivs_keys = ('hp', 'attack', 'defence', 'speed', 'spatk', 'spdef')
+team_header = re.compile(r'^===\s*(?:\[[^\]]*\]\s*)?(.*?)\s*===$')
+name_line = re.compile(r'^(.*?)\s*\(([^()]*)\)$')
+
+def parseShowdown(text: str) -> list:
+    # Splits Showdown text into teams of sets, without looking anything up in the rom.
+    # Teams are delimited by "=== [format] name ===" lines, text without any is a single team.
+    teams = []
+    team = None
+    current = None
+    for line in text.splitlines():
+        line = line.strip()
+        header = team_header.match(line)
+        if header:
+            team = {'name': header.group(1) or None, 'sets': []}
+            teams.append(team)
+            current = None
+        elif not line:
+            current = None
+        else:
+            if current is None:
+                if team is None:
+                    team = {'name': None, 'sets': []}
+                    teams.append(team)
+                current = parseNameLine(line)
+                team['sets'].append(current)
+            else:
+                parseSetLine(current, line)
+    return [team for team in teams if team['sets']]
+
+def parseNameLine(line: str) -> dict:
+    # "Nickname (Species) (M) @ Item", where everything but the species is optional
+    pokemon = {'nickname': None, 'gender': None, 'item': None, 'ability': None, 'level': 100, 'nature': None,
+               'shiny': False, 'evs': [0] * 6, 'ivs': [31] * 6, 'moves': []}
+    name, _, item = line.partition(' @ ')
+    if item:
+        pokemon['item'] = item.strip()
+    name = name.strip()
+    for gender in ('M', 'F'):
+        if name.endswith(f'({gender})'):
+            pokemon['gender'] = gender
+            name = name[:-3].strip()
+    nicknamed = name_line.match(name)
+    if nicknamed:
+        pokemon['nickname'], pokemon['species'] = nicknamed.group(1), nicknamed.group(2).strip()
+    else:
+        pokemon['species'] = name
+    return pokemon
+
+def parseSetLine(pokemon: dict, line: str):
+    if line.startswith('- '):
+        pokemon['moves'].append(line[2:].strip())
+    elif line.endswith(' Nature'):
+        pokemon['nature'] = line[:-len(' Nature')].strip()
+    elif ':' in line:
+        key, _, value = line.partition(':')
+        key, value = key.strip(), value.strip()
+        if key == 'Ability':
+            pokemon['ability'] = value
+        elif key == 'Level':
+            pokemon['level'] = int(value)
+        elif key == 'Gender':
+            pokemon['gender'] = value
+        elif key == 'Shiny':
+            pokemon['shiny'] = value.lower() == 'yes'
+        elif key in ('EVs', 'IVs'):
+            values = pokemon[key.lower()]
+            for part in value.split('/'):
+                amount, _, stat = part.strip().partition(' ')
+                if stat.strip() not in stat_names:
+                    raise ValueError(f"Unknown stat \"{stat}\" in \"{line}\"")
+                values[stat_names[stat.strip()]] = int(amount)
+        # Other lines (Happiness, Tera Type...) are ignored
+
+def pickPersonality(nature: int, gender: str, genderRatio: int, rng: random.Random, shiny: bool = False, otId: int = 0) -> int:
+    # Picks a random personality of the given nature whose low byte gives the requested gender.
+    # Shiny personalities are much rarer, one is picked among the ones searchPersonalities finds. Otherwise, the
+    # (1 in 8192) shiny personalities are drawn again.
+    if shiny:
+        candidates = list(searchPersonalities(nature, gender, genderRatio, True, otId))
+        if not candidates:
+            raise ValueError(f"This species can't be {'male' if gender == 'M' else 'female'}")
+        return rng.choice(candidates)
+    # The nature is personality % 25, and 256 % 25 == 6, so once the low byte is chosen the upper 24 bits
+    # only have to be ≡ (nature - low) * 6⁻¹ (mod 25), 6⁻¹ being 21 (mod 25).
+    lows = range(256)
+    if gender in ('M', 'F'):
+        lows = [low for low in lows if getGender(low, genderRatio) == f"({gender})"]
+        if not lows:
+            raise ValueError(f"This species can't be {'male' if gender == 'M' else 'female'}")
+    while True:
+        low = rng.choice(lows)
+        high = (nature - low) * 21 % 25
+        high += 25 * rng.randrange((0x1000000 - high + 24) // 25)
+        personality = (high << 8) | low
+        if not isShiny(personality, otId):
+            return personality
+
+def resolveSet(pokemon: dict, rom: dict, otId: int, otName: str = None, rng: random.Random = None, layouts: dict = default_layouts) -> Pokemon:
+    # Builds a new pokemon, ready to be encoded, from a set returned by parseShowdown
+    if rng is None:
+        rng = random.Random()
+    speciesId = nameIndex(rom, 'species')[pokemon['species']]
+    species = rom['species'][speciesId]
+    itemId = nameIndex(rom, 'items')[pokemon['item']] if pokemon['item'] else 0
+    if len(pokemon['moves']) > 4:
+        raise ValueError(f"{pokemon['species']} has {len(pokemon['moves'])} moves, the maximum is 4")
+    moveIds = [nameIndex(rom, 'moves')[move] for move in pokemon['moves']] + [0] * (4 - len(pokemon['moves']))
+
+    abilities = species['abilities']
+    abilityFlag = 0
+    if pokemon['ability']:
+        abilityId = nameIndex(rom, 'abilities')[pokemon['ability']]
+        if abilityId not in abilities[:2]:
+            raise ValueError(f"{species['name']} can't have the ability {pokemon['ability']}")
+        abilityFlag = abilities.index(abilityId)
+
+    nature = natures.index(pokemon['nature'].capitalize()) if pokemon['nature'] else rng.randrange(25)
+    personality = pickPersonality(nature, pokemon['gender'], species['genderRatio'][0], rng, pokemon.get('shiny', False), otId)
+    level = min(100, max(1, pokemon['level']))
+    growthRate = min(species.get('growthRate', 0), len(experience_tables) - 1)
+    nickname = pokemon['nickname'] or species['name'][:10]
+    if len(nickname) > 10:
+        raise ValueError(f"The nickname \"{nickname}\" is longer than 10 characters")
+
+    evs, ivs = pokemon['evs'], pokemon['ivs']
+    mon = Pokemon(
+        nickname=nickname,
+        species=species['name'].upper(),
+        Level=level,
+        exp=experience_tables[growthRate][level],
+        item=rom['items'][itemId]['name'] if itemId else 'NONE',
+        moves=[rom['movesNames'][moveId] for moveId in moveIds],
+        EvHp=evs[0], EvAtk=evs[1], EvDef=evs[2], EvSpe=evs[3], EvSpA=evs[4], EvSpD=evs[5],
+        Nature=natures[nature],
+        Ivs=IVs(**{key: ivs[k] for k, key in enumerate(ivs_keys)}, AbilityFlag=abilityFlag),
+        Ability=rom['abilities'][abilities[abilityFlag]]['name'],
+        Gender=getGender(personality, species['genderRatio'][0]),
+        personality=personality,
+        otId=otId,
+        speciesId=speciesId,
+        itemId=itemId,
+        moveIds=moveIds,
+        substructs=None,
+    )
+
+    # The record the pokemon is built over: the fields encodePokemonBatch doesn't write, and the party stats
+    party = layouts['pokemon']
+    stats = species['stats']
+    baseStats = (stats['hp'], stats['attack'], stats['defense'], stats['speed'], stats['spattack'], stats['spdefense'])
+    battleStats = calcStats(baseStats, ivs, evs, level, nature)
+    mon['Stats'] = Stats(**dict(zip(species_stats, battleStats)))
+    mon['raw'] = party.pack(
+        language=2, # English
+        flags=0x02, # hasSpecies
+        otName=utils.writestring(otName or '', 7),
+        hp=battleStats[0],
+        stats=battleStats,
+    )
+    return mon
+
+def importShowdown(text: str, rom: dict, otId: int, otName: str = None, seed: int = None) -> list:
+    # Returns the teams of the text as {'name', 'pokemon'} dicts, the pokemon being ready to be put in a save's team
+    # or boxes. A seed makes the picked personalities reproducible.
+    rng = random.Random(seed)
+    return [{'name': team['name'], 'pokemon': [resolveSet(pokemon, rom, otId, otName, rng) for pokemon in team['sets']]}
+            for team in parseShowdown(text)]
+
+def encodeTeams(teams: list, rom: dict, size: int = default_layouts['pokemon'].size) -> list:
+    # Encodes the pokemon of many teams at once (their substructures are all encrypted in one batch), and returns
+    # the records of each team
+    pokemon = [mon for team in teams for mon in team['pokemon']]
+    records = [bytes(record) for record, _ in encodePokemonBatch(pokemon, rom, size)]
+    encoded = []
+    for team in teams:
+        encoded.append(records[:len(team['pokemon'])])
+        records = records[len(team['pokemon']):]
+    return encoded
+
+def fillBoxes(save: dict, pokemon: list, box: int = 0) -> int:
+    # Puts the pokemon in the empty slots of the save's boxes, starting from the given box.
+    # Returns how many were placed, which is less than given if the boxes are full.
+    placed = 0
+    for content in save["boxes"][box:]:
+        slots = content["pokemon"]
+        for slot in range(len(slots)):
+            if placed == len(pokemon):
+                return placed
+            if slots[slot] is None:
+                slots[slot] = pokemon[placed]
+                placed += 1
+    return placed
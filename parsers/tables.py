@@ -0,0 +1,102 @@
+from .profiling import metrics
+from .charmap import terminator
+
+# Byte translation tables flagging (with 1) the bytes which aren't a string terminator, and the bytes which aren't 0
+not_terminator = bytes(int(b != terminator) for b in range(256))
+not_zero = bytes(int(b != 0) for b in range(256))
+
+def validRecords(rom, offset: int, stride: int, limit: int, terminated=(), zero=(), holes: bool = False) -> int:
+    # Counts how many records of a table, starting at offset, look valid before the first one that doesn't:
+    # each (offset, length) string of terminated has to hold a terminator, and each byte offset of zero has to be 0.
+    # With holes, invalid records (e.g. the zeroed entries of disabled species) don't end the table, which ends
+    # after its last valid record instead.
+    # Nothing is parsed per record: each byte position is sliced out of every record at once (a strided slice of
+    # the rom), translated to 0/1 flags, and the flags of all the checks are combined as integers.
+    limit = min(limit, (len(rom) - offset) // stride)
+    if limit <= 0:
+        return 0
+    bad = 0
+    with memoryview(rom) as view:
+        def column(k: int) -> int:
+            return view[offset + k : offset + k + stride*(limit - 1) + 1 : stride].tobytes()
+
+        for start, length in terminated:
+            unterminated = int.from_bytes(b'\x01' * limit, 'little')
+            for k in range(start, start + length):
+                unterminated &= int.from_bytes(column(k).translate(not_terminator), 'little')
+            bad |= unterminated
+        for k in zero:
+            bad |= int.from_bytes(column(k).translate(not_zero), 'little')
+    flags = bad.to_bytes(limit, 'little')
+    if holes:
+        return flags.rfind(b'\0') + 1
+    # The index of the first invalid record is the amount of leading valid (0) flags
+    return limit - len(flags.lstrip(b'\0'))
+
+class LazyTable:
+    # A read-only table of ROM records which are only decoded the first time they are indexed.
+    # It behaves like the lists/dicts returned by the eager readers: it can be indexed by id,
+    # iterated over (yielding the records), and exposes keys()/values()/items() like a dict.
+    def __init__(self, count: int, decode=None):
+        self.count = count
+        if decode is not None:
+            self.decode = decode # Called with a record's index, returns the decoded record
+        self.cache = {}
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError(f"Record {index} is out of range (table has {self.count} records)")
+        record = self.cache.get(index)
+        if record is None:
+            record = self.decode(index)
+            self.cache[index] = record
+            metrics.count('records.decoded')
+        return record
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def __contains__(self, index):
+        return isinstance(index, int) and 0 <= index < self.count
+
+    def get(self, index, default=None):
+        if index in self:
+            return self[index]
+        return default
+
+    def keys(self):
+        return range(self.count)
+
+    def values(self):
+        return iter(self)
+
+    def items(self):
+        for i in range(self.count):
+            yield i, self[i]
+
+    def decodedCount(self) -> int:
+        return len(self.cache)
+
+
+class ColumnTable(LazyTable):
+    # A table whose numeric fields were all unpacked in a single pass and are stored column by column
+    # (one array per field). Subclasses implement decode() to build a record from the columns, so
+    # per-record dicts are still only built when indexed.
+    # Column tables can be pickled, the per-record cache is left out of the pickle.
+    def __init__(self, count: int, columns: dict):
+        super().__init__(count)
+        self.columns = columns
+
+    def column(self, name: str):
+        return self.columns[name]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['cache'] = {}
+        return state
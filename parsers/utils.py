@@ -1,21 +1,19 @@
+import os
 import struct
-
+from . import charmap
 
 def byteArrayFromFile(path: str):
+    # Reads the file straight into the bytearray, instead of reading it as bytes and copying them
     with open(path, "rb") as file:
-        data = bytearray(file.read())
+        data = bytearray(os.fstat(file.fileno()).st_size)
+        file.readinto(data)
     return data
 
 def readstring(text):
-    chars = "0123456789!?.-         ,  ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
-    ret = ""
-    for i in text:
-        c = int(i) - 161
-        if c<0 or c>len(chars):
-            ret = ret + " "
-        else:
-            ret = ret + chars[c]
-    return ret.strip()
+    return charmap.decode(text).strip()
+
+def writestring(text: str, length: int = None) -> bytes:
+    return charmap.encode(text, length)
 
 def getExpansionVersion(rom):
     expansionVersionBytes = struct.unpack("<b b b", rom[522:525])
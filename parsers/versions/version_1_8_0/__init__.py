@@ -1,2 +1,7 @@
 from .rom import *
 from .rom_header import *
+from . import layouts
+from .layouts import detectTableCounts
+
+# Bump this whenever the output of this version's readers changes, to invalidate cached rom snapshots
+parser_version = 11
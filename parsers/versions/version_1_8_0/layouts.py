@@ -0,0 +1,211 @@
+from structures.layout import Layout
+from ...tables import validRecords
+
+# Layouts of the rom structures read for this version of the expansion.
+# Each one is compiled into a struct.Struct when this module is imported, the readers only pick fields out of it.
+# Adding a version should mostly be a matter of copying this file and fixing the offsets that moved.
+
+# Rom header parsing credit goes to
+# CebolaBros64 ( https://gist.github.com/CebolaBros64/c7eb2a3f48df5d4a8488ab75a7d0f9c9 )
+# Fields named None are part of the header but not exposed, fields marked with * should be filled with 0 or NULL
+# if using expansion (doesn't affect their offset)
+rom_header = Layout('RomHeader', [
+    # ROM HEADER (see the GBATEK documentation in rom_header.py)
+    ('ROM Entry Point',          '4s',  0x00),
+    ('Nintendo Logo',            '156s'),
+    ('Game Title',               '12s'),
+    ('Game Code',                '4s'),
+    ('Maker Code',               '2s'),
+    ('Fixed value',              'c'),
+    ('Main unit code',           'c'),
+    ('Device type',              'c'),
+    ('Software version',         'c',   0xBC), # After 7 bytes of reserved area
+    ('Complement check',         'c'),
+                                                # 2 bytes reserved area
+
+    # GF ROM HEADER
+    ('Game version',             '4s',  0x100),
+    ('Game language',            '4s'),
+    ('Game name',                '32s'),
+    (None,                       '4s'), # monFrontPics *
+    (None,                       '4s'), # monBackPics *
+    (None,                       '4s'), # monNormalPalettes *
+    (None,                       '4s'), # monShinyPalettes *
+    (None,                       '4s'), # monIcons *
+    (None,                       '4s'), # monIconPaletteIds *
+    ('monIconPalettes',          '4s'),
+    (None,                       '4s'), # monSpeciesNames *
+    ('moveNames',                'I'),
+    ('decorations',              '4s'),
+
+    ('flagsOffset',              'I'),
+    ('varsOffset',               'I'),
+    ('pokedexOffset',            'I'),
+    ('seen1Offset',              'I'),
+    ('seen2Offset',              'I'),
+
+    ('pokedexVar',               'I'),
+    ('pokedexFlag',              'I'),
+    ('mysteryEventFlag',         'I'),
+
+    ('pokedexCount',             'I'),
+    ('playerNameLength',         'b'),
+    ('trainerNameLength',        'b'),
+    ('pokemonNameLength1',       'b'),
+    ('pokemonNameLength2',       'b'),
+    (None,                       '13c'), # unk5 to unk17
+    ('saveBlock2Size',           'I',   0x188), # After 3 bytes of padding
+    ('saveBlock1Size',           'I'),
+
+    ('partyCountOffset',         'I'),
+    ('partyOffset',              'I'),
+    ('warpFlagsOffset',          'I'),
+    ('trainerIdOffset',          'I'),
+    ('playerNameOffset',         'I'),
+    ('playerGenderOffset',       'I'),
+    ('frontierStatusOffset',     'I'),
+    ('frontierStatusOffset2',    'I'),
+    ('externalEventFlagsOffset', 'I'),
+    ('externalEventDataOffset',  'I'),
+
+    ('unk16',                    '4s'),
+
+    ('speciesInfo',              'I'),
+    (None,                       'I'), # abilityNames *
+    (None,                       'I'), # abilityDescriptions *
+
+    ('items',                    'I'),
+    ('moves',                    'I'),
+    ('ballGfx',                  'I'),
+    ('ballPalettes',             'I'),
+
+    ('gcnLinkFlagsOffset',       'I'),
+    ('gameClearFlag',            'I'),
+    ('ribbonFlag',               'I'),
+
+    ('bagCountItems',            'B'),
+    ('bagCountKeyItems',         'B'),
+    ('bagCountPokeballs',        'B'),
+    ('bagCountTMHMs',            'B'),
+    ('bagCountBerries',          'B'),
+
+    ('pcItemsCount',             'B'),
+    (None,                       '2s'), # padding
+    ('pcItemsOffset',            'I'),
+    ('giftRibbonsOffset',        'I'),
+    ('enigmaBerryOffset',        'I'),
+    ('enigmaBerrySize',          'I'),
+    (None,                       '4s'), # moveDescriptions *
+    ('unk20',                    '4s'),
+
+    # RHH HEADER
+    ('rhh_magic',                '6s',  0x204), # Should be "RHHEXP"
+    ('expansionVersionMajor',    'b'),
+    ('expansionVersionMinor',    'b'),
+    ('expansionVersionPatch',    'b'),
+    ('expansionVersionFlags',    'c'),
+
+    ('movesCount',               'H'),
+    ('numSpecies',               'H'),
+    ('abilitiesCount',           'H'),
+    ('abilities',                'I'),
+])
+# Header fields holding a pointer into the rom, which are turned into file offsets
+rom_pointers = ('moveNames', 'speciesInfo', 'items', 'moves', 'abilities')
+rom_base_address = 0x8000000
+
+# struct SpeciesInfo
+species_info = Layout('SpeciesInfo', [
+    ('hp',          'B', 0),
+    ('attack',      'B'),
+    ('defense',     'B'),
+    ('speed',       'B'),
+    ('spattack',    'B'),
+    ('spdefense',   'B'),
+    ('type1',       'B'),
+    ('type2',       'B'),
+    ('genderRatio', 'B', 18),
+    ('friendship',  'B', 20),
+    ('growthRate',  'B'),
+    ('ability1',    'H', 24),
+    ('ability2',    'H'),
+    ('ability3',    'H'),
+    ('natDexNum',   'H', 56),
+], size=160, strings={
+    'category': (31, 13),
+    'name':     (44, lambda header: header['pokemonNameLength1'] + 1),
+})
+
+# struct Item
+item = Layout('Item', [
+    ('price', 'I', 0),
+], size=44, strings={
+    'name': (19, 13),
+})
+
+# struct Ability
+ability = Layout('Ability', [], size=28, strings={
+    'name': (0, 13),
+})
+
+# struct BattleMove
+battle_move = Layout('BattleMove', [
+    ('effect',                'H', 0),
+    ('power',                 'B'),
+    ('type',                  'B'),
+    ('accuracy',              'B'),
+    ('pp',                    'B'),
+    ('secondaryEffectChance', 'B'),
+    ('target',                'H', 8),
+    ('priority',              'b'),
+    ('category',              'B'), # split
+    ('argument',              'H'),
+    ('zMoveEffect',           'B'),
+    ('flags',                 'I', 16),
+], size=20)
+
+# gMoveNames entries
+move_name = Layout('MoveName', [], size=13, strings={
+    'name': (0, 13),
+})
+
+# Where each table starts (a header pointer), the header count of its entries when the header has one, and what a
+# valid record looks like: the strings which have to be terminated, and the bytes which have to be 0 (e.g. the top
+# byte of an item's price). Tables without any check are only bounded by the header count and the next table.
+tables = {
+    'species':   {'layout': species_info, 'pointer': 'speciesInfo', 'count': 'numSpecies',     'terminated': ('name', 'category')},
+    'moveNames': {'layout': move_name,    'pointer': 'moveNames',   'count': 'movesCount',     'terminated': ('name',)},
+    'moves':     {'layout': battle_move,  'pointer': 'moves',       'count': 'movesCount'},
+    'items':     {'layout': item,         'pointer': 'items',       'count': None,             'terminated': ('name',), 'zero': (3,)},
+    'abilities': {'layout': ability,      'pointer': 'abilities',   'count': 'abilitiesCount', 'terminated': ('name',)},
+}
+# Ids are 16 bits, so no table is longer than this
+max_table_count = 0x10000
+
+def detectTableCounts(rom, header: dict) -> dict:
+    # The amount of valid records of each table, found by scanning the rom. A table stops at its header count or at
+    # the next table the header points to. Within those bounds, a table with a header count ends after its last valid
+    # record, invalid ones being holes (disabled species are zeroed entries), and the items table, which has no
+    # count, at its first record failing the checks.
+    # The counts are kept in the header (header['tableCounts']), so they are cached with the rest of the rom.
+    starts = sorted(header[pointer] for pointer in rom_pointers if header.get(pointer, -1) >= 0)
+    counts = {}
+    for name, table in tables.items():
+        layout = table['layout']
+        offset = header[table['pointer']]
+        limit = max_table_count
+        counted = isinstance(table['count'], str)
+        if counted:
+            limit = header[table['count']]
+        following = [start for start in starts if start > offset]
+        if following:
+            limit = min(limit, (following[0] - offset) // layout.size)
+        terminated = [(layout.stringOffset(string), layout.stringLength(string, header)) for string in table.get('terminated', ())]
+        counts[name] = validRecords(rom, offset, layout.size, limit, terminated, table.get('zero', ()), holes=counted) if offset >= 0 else 0
+    return counts
+
+def tableBounds(header: dict, name: str) -> tuple:
+    # Returns the (offset, count, stride) of one of the tables above
+    table = tables[name]
+    count = header['tableCounts'][name] if 'tableCounts' in header else header[table['count']]
+    return header[table['pointer']], count, table['layout'].size
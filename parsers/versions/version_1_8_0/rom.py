@@ -1,112 +1,202 @@
-import struct
+from array import array
 from ... import utils
+from ... import charmap
+from ...tables import LazyTable, ColumnTable
 from ..constants import type_table
+from . import layouts
+from structures.records import Species, Stats, Item, Ability, Move
 
 
-abilities_struct_size = 13 + 4 + 1 + 1
-abilities_struct_padding = 9
-def readAbilities(rom, header):
-    abilities_offset = header['abilities']
-    abilities_count = header['abilitiesCount']
-    abilityNameLength = 12 + 1
-    abilities_dict = {}
+# The record layouts and table bounds are described in layouts.py
+
+def readAbilities(rom, header, lazy=False):
+    abilities_offset, abilities_count, ability_stride = layouts.tableBounds(header, 'abilities')
+    name_offset, abilityNameLength = layouts.ability.strings['name']
+
+    def decode(i):
+        ability_bytes = rom[abilities_offset + ability_stride*i : abilities_offset + ability_stride*(i+1)]
+        return parseAbility(ability_bytes, abilityNameLength, i)
 
+    if lazy:
+        return LazyTable(abilities_count, decode)
+
+    names = charmap.decodeTable(rom, abilities_offset, abilities_count, ability_stride, abilityNameLength, name_offset)
+    abilities_dict = {}
     for i in range(abilities_count):
-        ability_bytes = rom[abilities_offset + (abilities_struct_size+abilities_struct_padding)*i : abilities_offset + (abilities_struct_size+abilities_struct_padding)*(i+1)]
-        ability = parseAbility(ability_bytes, abilityNameLength, i)
-        abilities_dict[i] = ability
+        abilities_dict[i] = Ability(
+            id=i,
+            name=names[i]
+        )
     return abilities_dict
 
 def parseAbility(byteAbility, abilityNameLength, index):
-    name = utils.readstring(byteAbility[0:abilityNameLength])
-    return {
-        'id': index,
-        'name': name
-    }
-
-
-item_struct_size = 38
-item_struct_padding = 6
-def readItems(rom, header):
-    items_offset = header['items']
-    items_count = 846
-    itemNameLength = 13
-    items_dict = {}
+    name_offset = layouts.ability.stringOffset('name')
+    name = utils.readstring(byteAbility[name_offset:name_offset+abilityNameLength])
+    return Ability(
+        id=index,
+        name=name
+    )
 
+
+def readItems(rom, header, lazy=False):
+    items_offset, items_count, item_stride = layouts.tableBounds(header, 'items')
+    name_offset, itemNameLength = layouts.item.strings['name']
+
+    def decode(i):
+        item_bytes = rom[items_offset + item_stride*i : items_offset + item_stride*(i+1)]
+        return parseItem(item_bytes, itemNameLength, i)
+
+    if lazy:
+        return LazyTable(items_count, decode)
+
+    names = charmap.decodeTable(rom, items_offset, items_count, item_stride, itemNameLength, name_offset)
+    prices = layouts.item.columns(memoryview(rom)[items_offset:], items_count)['price']
+    items_dict = {}
     for i in range(items_count):
-        item_bytes = rom[items_offset + (item_struct_size+item_struct_padding)*i : items_offset + (item_struct_size+item_struct_padding)*(i+1)]
-        item = parseItem(item_bytes, itemNameLength, i)
-        items_dict[i] = item
+        items_dict[i] = Item(
+            id=i,
+            price=prices[i],
+            name=names[i],
+        )
     return items_dict
 
 def parseItem(byteItem, itemNameLength, index):
-    price = struct.unpack("<I", byteItem[0:4])[0]
-    name = utils.readstring(byteItem[19:19+itemNameLength])
-    return {
-        'id': index,
-        'price': price,
-        'name': name,
-    }
-
-def readMoves(rom, header):
-    move_names_offset = header['moveNames']
-    moves_count = header['movesCount']
-    moveNames = []
-    moveNameLength = 12 + 1
-
-    for i in range(moves_count):
+    fields = layouts.item.unpack(byteItem)
+    name_offset = layouts.item.stringOffset('name')
+    name = utils.readstring(byteItem[name_offset:name_offset+itemNameLength])
+    return Item(
+        id=index,
+        price=fields['price'],
+        name=name,
+    )
+
+def readMoves(rom, header, lazy=False):
+    move_names_offset, moves_count, moveNameLength = layouts.tableBounds(header, 'moveNames')
+
+    def decode(i):
         move_name_bytes = rom[move_names_offset + moveNameLength*i : move_names_offset + moveNameLength*(i+1)]
-        move_name = utils.readstring(move_name_bytes)
-        moveNames.append(move_name)
-    return moveNames
-
-species_struct_size = 160
-def readSpecies(rom, header):
-    species_offset = header['speciesInfo']
-    species_count = header['numSpecies']
+        return utils.readstring(move_name_bytes)
+
+    if lazy:
+        return LazyTable(moves_count, decode)
+
+    return charmap.decodeTable(rom, move_names_offset, moves_count, moveNameLength)
+
+move_categories = ('PHYSICAL', 'SPECIAL', 'STATUS')
+def readMoveData(rom, header, lazy=False):
+    moves_offset, moves_count, move_stride = layouts.tableBounds(header, 'moves')
+
+    if lazy:
+        def decode(i):
+            move_bytes = rom[moves_offset + move_stride*i : moves_offset + move_stride*(i+1)]
+            return parseMove(layouts.battle_move.unpack(move_bytes), i)
+        return LazyTable(moves_count, decode)
+
+    return MovesTable(bytes(rom[moves_offset : moves_offset + move_stride*moves_count]), moves_count)
+
+class MovesTable(ColumnTable):
+    # The battle data of every move, unpacked in a single pass into one array per field (all powers, all types...)
+    # Indexing it returns the same records as parseMove, built on demand.
+    def __init__(self, raw: bytes, count: int):
+        layout = layouts.battle_move
+        columns = {name: array(layout.accessors[name].format[-1], values) for name, values in layout.columns(raw, count).items()}
+        super().__init__(count, columns)
+
+    def decode(self, i):
+        return parseMove({name: column[i] for name, column in self.columns.items()}, i)
+
+def parseMove(fields, index):
+    return Move(
+        id=index,
+        effect=fields['effect'],
+        power=fields['power'],
+        type=type_table[fields['type']] if fields['type'] < len(type_table) else None,
+        accuracy=fields['accuracy'],
+        pp=fields['pp'],
+        secondaryEffectChance=fields['secondaryEffectChance'],
+        target=fields['target'],
+        priority=fields['priority'],
+        category=move_categories[fields['category']] if fields['category'] < len(move_categories) else None,
+    )
+
+def readSpecies(rom, header, lazy=False):
+    species_offset, species_count, species_stride = layouts.tableBounds(header, 'species')
     pokemonNameLength = header['pokemonNameLength1']
-    species_dict = {}
-
-    for i in range(species_count):
-        species_bytes = rom[species_offset + species_struct_size*i : species_offset + species_struct_size*(i+1)]
-        species = parseSpecies(species_bytes, pokemonNameLength, i)
-        species_dict[species['id']] = species
 
-        #print(f"{species['name']} ({species['natDexNum']}) is a {species['category']} Pokémon\n"
-        #    + f"    Its types are: {species['types']}\n"
-        #    + f"    It has {species['stats']['hp']} HP, {species['stats']['attack']} Attack, {species['stats']['defense']} Def, {species['stats']['speed']} Speed, {species['stats']['spattack']} SpAtk, {species['stats']['spdefense']} SpDef\n"
-        #    + f"    Its abilities are {species['abilities']}\n")
-    return species_dict
+    if lazy:
+        def decode(i):
+            species_bytes = rom[species_offset + species_stride*i : species_offset + species_stride*(i+1)]
+            return parseSpecies(species_bytes, pokemonNameLength, i)
+        return LazyTable(species_count, decode)
+
+    return SpeciesTable(bytes(rom[species_offset : species_offset + species_stride*species_count]), species_count, pokemonNameLength)
+
+class SpeciesTable(ColumnTable):
+    # The whole speciesInfo table decoded in a single struct.iter_unpack pass into one array per numeric field.
+    # Indexing it still returns the same dicts as parseSpecies, built on demand.
+    def __init__(self, raw: bytes, count: int, pokemonNameLength: int):
+        layout = layouts.species_info
+        columns = {name: array(layout.accessors[name].format[-1], values) for name, values in layout.columns(raw, count).items()}
+        super().__init__(count, columns)
+        header = {'pokemonNameLength1': pokemonNameLength}
+        self.names = charmap.decodeTable(raw, 0, count, layout.size, layout.stringLength('name', header), layout.stringOffset('name'))
+        self.categories = charmap.decodeTable(raw, 0, count, layout.size, layout.stringLength('category'), layout.stringOffset('category'))
+
+    def decode(self, i):
+        c = self.columns
+        if c['type1'][i] == c['type2'][i]:
+            types = (type_table[c['type1'][i]])
+        else:
+            types = (type_table[c['type1'][i]], type_table[c['type2'][i]])
+        return Species(
+            id=i,
+            name=self.names[i],
+            natDexNum=c['natDexNum'][i],
+            stats=Stats(
+                hp=       c['hp'][i],
+                attack=   c['attack'][i],
+                defense=  c['defense'][i],
+                speed=    c['speed'][i],
+                spattack= c['spattack'][i],
+                spdefense=c['spdefense'][i]
+            ),
+            types=types,
+            abilities=(c['ability1'][i], c['ability2'][i], c['ability3'][i]),
+            category=self.categories[i],
+            genderRatio=(c['genderRatio'][i],),
+            growthRate=c['growthRate'][i],
+            friendship=c['friendship'][i],
+        )
 
 
 def parseSpecies(byteSpecies, pokemonNameLength, index):
-    stats = struct.unpack('< B B B B B B  ', byteSpecies[0:6])
-    typesNumbers = struct.unpack('< B B ', byteSpecies[6:8])
-    if typesNumbers[0] == typesNumbers[1]:
-        types = (type_table[typesNumbers[0]])
+    layout = layouts.species_info
+    fields = layout.unpack(byteSpecies)
+    if fields['type1'] == fields['type2']:
+        types = (type_table[fields['type1']])
     else:
-        types = (type_table[typesNumbers[0]], type_table[typesNumbers[1]])
-    abilities = struct.unpack('< H H H ', byteSpecies[24:30])
-    category = utils.readstring(byteSpecies[31 : 31 + 13])
-    name = utils.readstring(byteSpecies[44 : 44 + pokemonNameLength+1])
-    genderRatio = struct.unpack('< B', byteSpecies[18:19])
-
-    natDexNum = struct.unpack('<H', byteSpecies[56 : 58])[0]
-
-    return {
-        'id': index,
-        'name': name,
-        'natDexNum': natDexNum,
-        'stats': {
-            'hp':       stats[0],
-            'attack':   stats[1],
-            'defense':  stats[2],
-            'speed':    stats[3],
-            'spattack': stats[4],
-            'spdefense':stats[5]
-        },
-        'types': types,
-        'abilities': abilities,
-        'category': category,
-        'genderRatio': genderRatio,
-    }
+        types = (type_table[fields['type1']], type_table[fields['type2']])
+    category_offset, category_length = layout.strings['category']
+    category = utils.readstring(byteSpecies[category_offset : category_offset + category_length])
+    name_offset = layout.stringOffset('name')
+    name = utils.readstring(byteSpecies[name_offset : name_offset + pokemonNameLength+1])
+
+    return Species(
+        id=index,
+        name=name,
+        natDexNum=fields['natDexNum'],
+        stats=Stats(
+            hp=       fields['hp'],
+            attack=   fields['attack'],
+            defense=  fields['defense'],
+            speed=    fields['speed'],
+            spattack= fields['spattack'],
+            spdefense=fields['spdefense']
+        ),
+        types=types,
+        abilities=(fields['ability1'], fields['ability2'], fields['ability3']),
+        category=category,
+        genderRatio=(fields['genderRatio'],),
+        growthRate=fields['growthRate'],
+        friendship=fields['friendship'],
+    )
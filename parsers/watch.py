@@ -0,0 +1,209 @@
+import os
+import time
+from . import utils
+from . import checksum
+from .profiling import metrics
+from .pokemon import decodePokemonBatch, isOccupied
+from .save import readSlotFooters, getCurrentSave, readSection, process, readTrainer, readStorage
+from .progress import readProgress
+from .bag import readSaveBag
+from structures.saves import offsets_dict, gamedata_dict, layouts_dict, section_size, section_data_size, pc_sections
+
+# Keeps a save parsed while it is being rewritten, e.g. by an emulator.
+# The file is polled (its mtime and size first, then the 28 footers of its slots). Only the sections whose footer
+# changed (their checksum, index or position) are read from the file and checksummed, the others are reused from
+# the previous polls. Of those, only the sections whose data changed are decoded again: the trainer info for section 0, the team for
+# section 1, the flags, vars, pokedex and bag for sections 0 to 4, and the box pokemon stored in the changed PC sections.
+# A save caught while it is being written (a slot with missing sections or bad checksums) is read again on the next
+# poll.
+#
+#   watcher = SaveWatcher('./pokeemerald.sav', "expansion", rom)
+#   for save, sections in watcher.watch():
+#       print(sections, [mon['species'] for mon in save['team']])
+
+class SaveWatcher:
+    def __init__(self, path: str, game_version: str, rom: dict, slot_policy: str = "fallback"):
+        self.path = path
+        self.game_version = game_version
+        self.rom = rom
+        self.slot_policy = slot_policy
+        self.offsets = offsets_dict[game_version][rom["expansionVersion"]]
+        self.gamedata = gamedata_dict[game_version]
+        self.layouts = layouts_dict[game_version][rom["expansionVersion"]]
+        self.sizes = checksum.getSectionSizes(rom.get("header"))
+        self.stat = None
+        self.info = None # The getSaveInfo of the current slot
+        self.save = None # Its processed data, as returned by parseSave
+        # The sections read so far, by (slot, section id): (position, checksum, index, raw bytes, valid)
+        self.sections = {}
+
+    def poll(self):
+        # Returns the list of the section ids decoded again (all of them the first time), or None if the save
+        # didn't change since the last poll
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stat = (stat.st_mtime_ns, stat.st_size)
+        if stat == self.stat:
+            return None
+        self.stat = stat
+
+        with metrics.phase('watchRefresh'):
+            try:
+                with open(self.path, 'rb') as f:
+                    info = self.readSlot(f)
+                previous = self.info
+                if previous is None:
+                    save = process(info, self.game_version, self.rom)
+                    self.info, self.save = info, save
+                    metrics.count('watch.fullRefreshes')
+                    return list(range(14))
+            except (OSError, ValueError) as e:
+                # Most likely written right now, it is read again on the next poll
+                self.stat = None
+                metrics.count('watch.retries')
+                metrics.record('watch.lastError', str(e))
+                return None
+
+            changed = self.sectionsChanged(previous, info)
+            self.info = info
+            # Even when no data changed (e.g. the game saved without anything new), the save now lives in another slot
+            self.update(info, changed)
+            metrics.count('watch.sectionsDecoded', len(changed))
+            return changed or None
+
+    def readFooters(self, f) -> tuple:
+        # The readSlotFooters of both slots, only reading their footers and the playtime of their section 0
+        data = bytearray(self.offsets["save_b"][1])
+        for name in ("save_a", "save_b"):
+            for position in range(14):
+                section_offset = self.offsets[name][0] + position * section_size
+                for start, length in ((section_offset + checksum.footer_offset, 12), (section_offset + 14, 5)):
+                    f.seek(start)
+                    chunk = f.read(length)
+                    if len(chunk) != length:
+                        raise ValueError(f"The save is shorter than {self.offsets['save_b'][1]} bytes")
+                    data[start : start + length] = chunk
+        slot_a, slot_b = readSlotFooters(data, self.offsets["save_a"][0]), readSlotFooters(data, self.offsets["save_b"][0])
+        slot_a["slot"], slot_b["slot"] = "A", "B"
+        return slot_a, slot_b
+
+    def readSlot(self, f) -> dict:
+        # Like selectSlot, but only the sections whose footer changed since they were last read are read again
+        slot_a, slot_b = self.readFooters(f)
+        candidates = [getCurrentSave(slot_a, slot_b, self.slot_policy)]
+        if self.slot_policy == "fallback":
+            other = slot_b if candidates[0] is slot_a else slot_a
+            if other["valid"]:
+                candidates.append(other)
+        for candidate in candidates:
+            if not candidate["valid"]:
+                continue
+            info = self.loadSlot(f, candidate)
+            if info["valid"] or self.slot_policy == "index":
+                return info
+        missing = [f"slot {slot['slot']}: {14 - len(slot['footers'])} missing" for slot in (slot_a, slot_b) if not slot["valid"]]
+        raise ValueError(f"No save slot can be read ({', '.join(missing) or 'bad checksums'})")
+
+    def loadSlot(self, f, slot: dict) -> dict:
+        slot_offset = self.offsets["save_a" if slot["slot"] == "A" else "save_b"][0]
+        data = bytearray(14 * section_size)
+        view = memoryview(data)
+        info = {"sections": [{} for _ in range(14)], "slot": slot["slot"], "index": slot["index"], "playtime": slot["playtime"], "valid": True, "data": view}
+        read = 0
+        for section_id, footer in slot["footers"].items():
+            position = footer[0]
+            cached = self.sections.get((slot["slot"], section_id))
+            if cached is not None and cached[:3] == footer:
+                raw, valid = cached[3], cached[4]
+            else:
+                f.seek(slot_offset + position * section_size)
+                raw = f.read(section_size)
+                if len(raw) != section_size:
+                    raise ValueError(f"The save is shorter than {slot_offset + (position + 1) * section_size} bytes")
+                valid = None
+                read += 1
+            data[position * section_size : (position + 1) * section_size] = raw
+            section = readSection(view, position, self.sizes, valid)
+            if section is None or section["id"] != section_id:
+                raise ValueError(f"Section {section_id} of slot {slot['slot']} changed while it was read")
+            info["sections"][section_id] = section
+            info["valid"] = info["valid"] and section["valid"]
+            self.sections[(slot["slot"], section_id)] = footer + (raw, section["valid"])
+        metrics.count('watch.sectionsRead', read)
+        return info
+
+    def sectionsChanged(self, old: dict, new: dict) -> list:
+        changed = []
+        for i in range(14):
+            a, b = old["sections"][i], new["sections"][i]
+            if old["slot"] == new["slot"] and (a["i"], a["checksum"], a["index"]) == (b["i"], b["checksum"], b["index"]):
+                # The same footer at the same place, so the section wasn't read again
+                continue
+            if a["checksum"] != b["checksum"] or a["rawData"][:section_data_size] != b["rawData"][:section_data_size]:
+                changed.append(i)
+        return changed
+
+    def update(self, info: dict, changed: list):
+        save = self.save
+        sections = info["sections"]
+        save["slot"] = info["slot"]
+        save["index"] = info["index"]
+        save["slotData"] = info["data"]
+        save["sectionOffsets"] = [section.get("i") for section in sections]
+
+        if 0 in changed:
+            save.update(readTrainer(sections[0]["rawData"], self.offsets, self.gamedata))
+        if 1 in changed:
+            size = self.layouts["pokemon"].size
+            data = sections[1]["rawData"]
+            save["team_count"] = int.from_bytes(data[self.offsets["team_count"][0]:self.offsets["team_count"][1]], 'little')
+            records = [data[self.offsets["team_offset"] + i*size : self.offsets["team_offset"] + (i+1)*size] for i in range(save["team_count"])]
+            save["team"] = decodePokemonBatch(records, self.rom, self.layouts)
+        if any(i in changed for i in range(5)):
+            save.update(readProgress(sections, self.rom.get("header"), self.offsets, self.sizes))
+            save["bag"] = readSaveBag(sections, self.rom.get("header"), save["security_key"], self.rom, self.sizes)
+        changed_pc = [i for i in changed if i in pc_sections]
+        if changed_pc:
+            self.updateBoxes(readStorage(sections), changed_pc)
+
+    def updateBoxes(self, storage: bytes, changed: list):
+        # Decodes again the box names, wallpapers and pokemon stored (even partly) in the changed PC sections
+        offsets = self.offsets
+        size = self.layouts["box_pokemon"].size
+        box_size = offsets["pc_box_size"]
+        chunks = [((i - pc_sections[0]) * section_data_size, (i - pc_sections[0] + 1) * section_data_size) for i in changed]
+
+        def touched(start: int, end: int) -> bool:
+            return any(start < chunk_end and end > chunk_start for chunk_start, chunk_end in chunks)
+
+        boxes = self.save["boxes"]
+        self.save["current_box"] = storage[offsets["pc_current_box"]]
+        records = []
+        positions = []
+        for box in range(offsets["pc_box_count"]):
+            name_offset = offsets["pc_box_names_offset"] + box*9
+            if touched(name_offset, name_offset + 9):
+                boxes[box]["name"] = utils.readstring(storage[name_offset:name_offset+9])
+            boxes[box]["wallpaper"] = storage[offsets["pc_box_wallpapers_offset"] + box]
+            for slot in range(box_size):
+                start = offsets["pc_boxes_offset"] + (box*box_size + slot)*size
+                if not touched(start, start + size):
+                    continue
+                record = storage[start:start+size]
+                if isOccupied(record):
+                    records.append(record)
+                    positions.append((box, slot))
+                else:
+                    boxes[box]["pokemon"][slot] = None
+        for (box, slot), pokemon in zip(positions, decodePokemonBatch(records, self.rom, self.layouts)):
+            boxes[box]["pokemon"][slot] = pokemon
+
+    def watch(self, interval: float = 0.25):
+        # Yields (save, changed section ids) each time the save changes, forever
+        while True:
+            changed = self.poll()
+            if changed:
+                yield self.save, changed
+            time.sleep(interval)
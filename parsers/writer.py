@@ -0,0 +1,125 @@
+import struct
+from . import utils
+from . import checksum
+from .pokemon import encodePokemonBatch, isOccupied, default_layouts
+from .progress import encodeProgress
+from .bag import encodeBag
+from structures.saves import offsets_dict, gamedata_dict, layouts_dict, section_size, section_data_size, pc_sections
+
+# Writes an edited save (as returned by parseSave) back to its file.
+# Like the game, the new save is written over the older of the two slots with an incremented save index,
+# so the slot it was read from stays untouched. The new slot starts as a copy of the slot the save was read
+# from: only the sections holding edited data are patched and checksummed again, and only edited pokemon are
+# encrypted again. The slot is then written to the file in a single write.
+
+def writeSave(path, save: dict, game_version: str, rom: dict) -> dict:
+    offsets = offsets_dict[game_version][rom["expansionVersion"]]
+    layouts = layouts_dict[game_version][rom["expansionVersion"]]
+    pokemon_struct_size = layouts["pokemon"].size
+    sizes = checksum.getSectionSizes(rom.get("header"))
+    buffer = bytearray(save["slotData"])
+    sectionOffsets = save["sectionOffsets"]
+    dirty = set()
+
+    def patch(section_id: int, offset: int, data: bytes):
+        start = sectionOffsets[section_id] + offset
+        if buffer[start : start + len(data)] != data:
+            buffer[start : start + len(data)] = data
+            dirty.add(section_id)
+
+    # Section 0 data
+    name = save["name"]
+    if len(name) > 7:
+        raise ValueError(f"The player's name \"{name}\" is longer than 7 characters")
+    if utils.readstring(sectionData(buffer, sectionOffsets, 0)[0:7]).strip() != name:
+        patch(0, 0, utils.writestring(name, 8))
+    if "gender" in offsets and save["gender"] is not None:
+        patch(0, offsets["gender"], bytes([gamedata_dict[game_version]["genders"].index(save["gender"])]))
+
+    # Section 1 data
+    team = save["team"]
+    if len(team) > 6:
+        raise ValueError(f"The team has {len(team)} pokemon, the maximum is 6")
+    patch(1, offsets["team_count"][0], struct.pack('<I', len(team)))
+    for i, (record, changed) in enumerate(encodePokemonBatch(team, rom, pokemon_struct_size, layouts)):
+        if changed:
+            patch(1, offsets["team_offset"] + i*pokemon_struct_size, bytes(record))
+    for i in range(len(team), save.get("team_count", 6)):
+        patch(1, offsets["team_offset"] + i*pokemon_struct_size, bytes(pokemon_struct_size))
+    save["team_count"] = len(team)
+
+    # Flags, vars and pokedex, in sections 0 to 4, and the bag in section 1
+    if rom.get("header"):
+        for section_id, offset, data in encodeProgress(save, rom["header"]):
+            patch(section_id, offset, data)
+        if save.get("bag") is not None:
+            for section_id, offset, data in encodeBag(save["bag"], rom["header"], save["security_key"], rom):
+                patch(section_id, offset, data)
+
+    # Sections 5 to 13 data
+    writeBoxes(buffer, sectionOffsets, save["boxes"], offsets, rom, dirty, layouts)
+
+    for section_id in dirty:
+        checksum.updateSectionChecksum(buffer, sectionOffsets[section_id], sizes)
+
+    index = (save["index"] + 1) & 0xFFFFFFFF
+    for section_id in range(14):
+        struct.pack_into('<I', buffer, sectionOffsets[section_id] + checksum.footer_offset + 8, index)
+
+    slot = "B" if save["slot"] == "A" else "A"
+    slot_offset = offsets["save_a" if slot == "A" else "save_b"][0]
+    if isinstance(path, bytearray):
+        # The save file's content, edited in place
+        path[slot_offset : slot_offset + len(buffer)] = buffer
+    else:
+        with open(path, 'r+b') as f:
+            f.seek(slot_offset)
+            f.write(buffer)
+
+    save["slot"] = slot
+    save["index"] = index
+    save["slotData"] = bytes(buffer)
+    return save
+
+def sectionData(buffer, sectionOffsets: list, section_id: int):
+    return memoryview(buffer)[sectionOffsets[section_id] : sectionOffsets[section_id] + section_size]
+
+def writeBoxes(buffer: bytearray, sectionOffsets: list, boxes: list, offsets: dict, rom: dict, dirty: set, layouts: dict = default_layouts):
+    # The PC storage is split over sections 5 to 13 by chunks of 3968 bytes, so a pokemon can straddle two sections.
+    # Edits are made on the reassembled storage, and only the chunks they touched are copied back.
+    storage = bytearray(b''.join(sectionData(buffer, sectionOffsets, i)[:section_data_size] for i in pc_sections))
+    edited_ranges = []
+
+    def patch(offset: int, data: bytes):
+        if storage[offset : offset + len(data)] != data:
+            storage[offset : offset + len(data)] = data
+            edited_ranges.append((offset, offset + len(data)))
+
+    box_size = offsets["pc_box_size"]
+    box_pokemon_struct_size = layouts["box_pokemon"].size
+    positions = []
+    pokemon = []
+    for box, content in enumerate(boxes[:offsets["pc_box_count"]]):
+        name_offset = offsets["pc_box_names_offset"] + box*9
+        if utils.readstring(storage[name_offset:name_offset+9]) != content["name"]:
+            patch(name_offset, utils.writestring(content["name"], 9))
+        patch(offsets["pc_box_wallpapers_offset"] + box, bytes([content["wallpaper"]]))
+        for slot, mon in enumerate(content["pokemon"][:box_size]):
+            record_offset = offsets["pc_boxes_offset"] + (box*box_size + slot)*box_pokemon_struct_size
+            if mon is not None:
+                positions.append(record_offset)
+                pokemon.append(mon)
+            elif isOccupied(storage[record_offset:record_offset+box_pokemon_struct_size]):
+                patch(record_offset, bytes(box_pokemon_struct_size))
+
+    for record_offset, (record, changed) in zip(positions, encodePokemonBatch(pokemon, rom, box_pokemon_struct_size, layouts)):
+        if changed or storage[record_offset:record_offset+box_pokemon_struct_size] != record:
+            patch(record_offset, bytes(record))
+
+    for k, section_id in enumerate(pc_sections):
+        chunk_start = k * section_data_size
+        chunk_end = chunk_start + section_data_size
+        if any(start < chunk_end and end > chunk_start for start, end in edited_ranges):
+            start = sectionOffsets[section_id]
+            buffer[start : start + section_data_size] = storage[chunk_start:chunk_end]
+            dirty.add(section_id)
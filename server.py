@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from parsers.rom import parseRom
+from parsers.save import parseSaveData
+from parsers.writer import writeSave
+from parsers.showdown import importShowdown, fillBoxes
+from parsers.profiling import Metrics
+from structures.saves import offsets_dict
+import export
+
+# A local HTTP/JSON service, so that tools don't pay for the interpreter's startup and parseRom on every save.
+# The roms are loaded once, and saves are sent as the request's body. Decoding runs in a pool of worker processes
+# which all hold the roms, so the event loop keeps serving requests meanwhile.
+#
+#   python server.py --rom emerald=./pokeemerald.gba --port 8080
+#
+#   GET  /roms                                      The loaded roms
+#   GET  /metrics                                   Timing of the requests, per route
+#   POST /parse?rom=emerald                         The save's data, as JSON
+#   POST /export?rom=emerald&boxes=all              The party (and boxes: all, or e.g. 0,1) in Showdown format
+#   POST /import?rom=emerald&target=team            Body: {"save": "<hex>", "showdown": "<text>"}, target team or boxes.
+#                                                   Returns the edited save file
+#
+# Every POST also takes a game_version, "expansion" by default.
+
+max_body_size = 1 << 20
+
+# The roms of the worker processes, by name. Like in parsers.batch, they are inherited from the parent when
+# processes are forked, and loaded by initWorker otherwise.
+worker_roms = {}
+
+def initWorker(rom_paths: dict, cache_dir: str):
+    for name, path in rom_paths.items():
+        if name not in worker_roms:
+            worker_roms[name] = parseRom(path, cache_dir=cache_dir)
+
+def jsonSave(save: dict) -> dict:
+    # The parsed save without its raw data
+    data = {key: value for key, value in save.items() if key not in ("slotData", "sectionOffsets")}
+    data["team"] = [jsonPokemon(mon) for mon in save["team"]]
+    data["boxes"] = [dict(box, pokemon=[jsonPokemon(mon) if mon is not None else None for mon in box["pokemon"]]) for box in save["boxes"]]
+    # Flags and the pokedex as the lists of their set bits
+    if save.get("flags") is not None:
+        data["flags"] = save["flags"].indexes()
+    if save.get("vars") is not None:
+        data["vars"] = save["vars"].tolist()
+    if save.get("pokedex") is not None:
+        data["pokedex"] = {key: [i + 1 for i in bits.indexes()] for key, bits in save["pokedex"].items()}
+    if save.get("bag") is not None:
+        data["bag"] = {pocket: [slot.asDict() for slot in slots] for pocket, slots in save["bag"].items()}
+    return data
+
+def jsonPokemon(pokemon) -> dict:
+    data = pokemon.asDict()
+    del data["raw"], data["substructs"]
+    return data
+
+def parseJob(rom: str, game_version: str, data: bytes) -> dict:
+    return jsonSave(parseSaveData(data, game_version, worker_roms[rom]))
+
+def exportJob(rom: str, game_version: str, data: bytes, boxes) -> str:
+    save = parseSaveData(data, game_version, worker_roms[rom])
+    return ''.join(export.iterSave(save, boxes=boxes))
+
+def importJob(rom: str, game_version: str, data: bytes, text: str, target: str) -> bytes:
+    rom_data = worker_roms[rom]
+    data = bytearray(data)
+    save = parseSaveData(data, game_version, rom_data)
+    teams = importShowdown(text, rom_data, save["trainer_id"], save["name"])
+    pokemon = [mon for team in teams for mon in team["pokemon"]]
+    if target == "team":
+        save["team"] = pokemon
+    elif target == "boxes":
+        if fillBoxes(save, pokemon) < len(pokemon):
+            raise ValueError("There isn't enough room in the boxes")
+    else:
+        raise ValueError(f"Unknown target {target}, it should be team or boxes")
+    writeSave(data, save, game_version, rom_data)
+    return bytes(data)
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+statuses = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+class Server:
+    def __init__(self, rom_paths: dict, workers: int = None, cache_dir: str = None):
+        self.rom_paths = rom_paths
+        self.metrics = Metrics()
+        self.metrics.enable()
+        # The roms are also loaded in this process, for /roms, and to be inherited by forked workers
+        initWorker(rom_paths, cache_dir)
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, mp_context=context, initializer=initWorker, initargs=(rom_paths, cache_dir))
+
+    async def run(self, job, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, job, *args)
+
+    async def handle(self, method: str, path: str, query: dict, body: bytes):
+        # Returns (content type, content)
+        if path == "/roms" and method == "GET":
+            return "application/json", {name: {"path": rom_path, "expansionVersion": worker_roms[name]["expansionVersion"]} for name, rom_path in self.rom_paths.items()}
+        if path == "/metrics" and method == "GET":
+            return "application/json", self.metrics.asDict()
+        if path not in ("/parse", "/export", "/import"):
+            raise HTTPError(404, f"Unknown route {path}")
+        if method != "POST":
+            raise HTTPError(405, f"{path} only accepts POST requests")
+
+        rom = query.get("rom", next(iter(self.rom_paths)) if len(self.rom_paths) == 1 else None)
+        if rom not in self.rom_paths:
+            raise HTTPError(404, f"Unknown rom {rom}, the loaded roms are {', '.join(self.rom_paths)}")
+        game_version = query.get("game_version", "expansion")
+        if game_version not in offsets_dict:
+            raise HTTPError(400, f"Unknown game version {game_version}")
+
+        if path == "/parse":
+            return "application/json", await self.run(parseJob, rom, game_version, body)
+        if path == "/export":
+            boxes = query.get("boxes")
+            if boxes not in (None, "all"):
+                boxes = [int(box) for box in boxes.split(",")]
+            return "text/plain; charset=utf-8", await self.run(exportJob, rom, game_version, body, boxes)
+        request = json.loads(body)
+        return "application/octet-stream", await self.run(importJob, rom, game_version, bytes.fromhex(request["save"]), request["showdown"], query.get("target", "team"))
+
+    async def respond(self, writer, status: int, content_type: str, content, keep_alive: bool):
+        if isinstance(content, str):
+            content = content.encode()
+        elif not isinstance(content, bytes):
+            content = json.dumps(content, default=str).encode()
+        head = f"HTTP/1.1 {status} {statuses[status]}\r\nContent-Type: {content_type}\r\nContent-Length: {len(content)}\r\n"
+        head += "Connection: keep-alive\r\n\r\n" if keep_alive else "Connection: close\r\n\r\n"
+        writer.write(head.encode() + content)
+        await writer.drain()
+
+    async def connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                url = urlsplit(target)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+                with self.metrics.phase(f"{method} {url.path}"):
+                    try:
+                        length = int(headers.get("content-length", 0))
+                        if length > max_body_size:
+                            keep_alive = False
+                            raise HTTPError(413, f"The request's body is larger than {max_body_size} bytes")
+                        body = await reader.readexactly(length) if length else b""
+                        content_type, content = await self.handle(method, url.path, query, body)
+                        status = 200
+                    except HTTPError as e:
+                        status, content_type, content = e.status, "application/json", {"error": str(e)}
+                    except (ValueError, KeyError) as e:
+                        status, content_type, content = 400, "application/json", {"error": str(e)}
+                    except Exception as e:
+                        status, content_type, content = 500, "application/json", {"error": repr(e)}
+                if status != 200:
+                    self.metrics.count(f"{method} {url.path} errors")
+                await self.respond(writer, status, content_type, content, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080, unix: str = None):
+        if unix:
+            server = await asyncio.start_unix_server(self.connection, unix)
+        else:
+            server = await asyncio.start_server(self.connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves parse, export and import requests for saves over HTTP")
+    parser.add_argument('--rom', action='append', required=True, help="A rom to load, as name=path (or only a path, named after the file)")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--unix', help="Listen on this unix socket instead of a TCP port")
+    parser.add_argument('--workers', type=int, help="Amount of worker processes, one per core by default")
+    parser.add_argument('--cache-dir', default='./.ese_cache', help="Where parsed roms are cached")
+    args = parser.parse_args()
+
+    rom_paths = {}
+    for rom in args.rom:
+        name, _, path = rom.rpartition('=')
+        rom_paths[name or os.path.splitext(os.path.basename(path))[0]] = path
+
+    server = Server(rom_paths, args.workers, args.cache_dir)
+    print(f"Serving {', '.join(rom_paths)} on {args.unix or f'http://{args.host}:{args.port}'}")
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.pool.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# A fixed size set of bits stored in a bytearray, with the game's bit order: bit i is bit (i % 8) of byte i // 8.
+# Used for the event flags and the pokedex, so that counting or combining them is done on whole integers
+# instead of testing each flag.
+#
+#   caught = pokedex["owned"]
+#   caught[24], caught.count()
+#   everything = save_a["flags"] | save_b["flags"]
+
+class Bitset:
+    __slots__ = ('data', 'size')
+
+    def __init__(self, data=b'', size: int = None):
+        self.data = bytearray(data)
+        self.size = len(self.data) * 8 if size is None else size
+        if len(self.data) * 8 < self.size:
+            self.data.extend(bytes((self.size + 7) // 8 - len(self.data)))
+
+    @classmethod
+    def fromInt(cls, value: int, size: int):
+        return cls(value.to_bytes((size + 7) // 8, 'little'), size)
+
+    def __len__(self):
+        return self.size
+
+    def _check(self, i: int) -> int:
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError(f"Bit {i} is out of range, there are {self.size} bits")
+        return i
+
+    def __getitem__(self, i: int) -> bool:
+        i = self._check(i)
+        return bool(self.data[i >> 3] >> (i & 7) & 1)
+
+    def __setitem__(self, i: int, value: bool):
+        i = self._check(i)
+        if value:
+            self.data[i >> 3] |= 1 << (i & 7)
+        else:
+            self.data[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+    def __int__(self):
+        return int.from_bytes(self.data, 'little') & ((1 << self.size) - 1)
+
+    def __bytes__(self):
+        return bytes(self.data)
+
+    def __eq__(self, other):
+        return isinstance(other, Bitset) and self.size == other.size and int(self) == int(other)
+
+    def __repr__(self):
+        return f"Bitset({self.count()}/{self.size})"
+
+    def count(self, start: int = 0, stop: int = None) -> int:
+        # The amount of set bits, in the whole set or in range(start, stop)
+        stop = self.size if stop is None else min(stop, self.size)
+        if start >= stop:
+            return 0
+        return ((int(self) >> start) & ((1 << (stop - start)) - 1)).bit_count()
+
+    def setRange(self, start: int, stop: int, value: bool = True):
+        # Sets (or clears) every bit of range(start, stop). Whole bytes are filled at once
+        stop = min(stop, self.size)
+        while start < stop and start & 7:
+            self[start] = value
+            start += 1
+        while start < stop and stop & 7:
+            stop -= 1
+            self[stop] = value
+        if start < stop:
+            self.data[start >> 3 : stop >> 3] = (b'\xff' if value else b'\x00') * ((stop - start) >> 3)
+
+    def clearRange(self, start: int, stop: int):
+        self.setRange(start, stop, False)
+
+    def indexes(self) -> list:
+        # The set bits, in increasing order. Bytes without any set bit are skipped
+        return [(k << 3) | bit for k, byte in enumerate(self.data) if byte for bit in range(8) if byte >> bit & 1 and (k << 3) | bit < self.size]
+
+    def __or__(self, other):
+        return Bitset.fromInt(int(self) | int(other), max(self.size, other.size))
+
+    def __and__(self, other):
+        return Bitset.fromInt(int(self) & int(other), max(self.size, other.size))
+
+    def __xor__(self, other):
+        return Bitset.fromInt(int(self) ^ int(other), max(self.size, other.size))
+
+    def __sub__(self, other):
+        # The bits set here but not in other
+        return Bitset.fromInt(int(self) & ~int(other), self.size)
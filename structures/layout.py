@@ -0,0 +1,91 @@
+import struct
+
+# Declarative description of binary records.
+# A Layout is a list of (name, format, offset) fields which is compiled once into a single struct.Struct, so a whole
+# record is decoded with one unpack call. The offset can be left out to put a field right after the previous one, and
+# gaps between fields are skipped with pad bytes. A field named None is unpacked but not exposed.
+# Strings are described apart, as (offset, length) pairs, since they are decoded with the charmap codec rather than
+# unpacked. A length can be a function of the rom header when it depends on it.
+
+class Layout:
+    def __init__(self, name: str, fields: list, size: int = None, strings: dict = None):
+        self.name = name
+        self.strings = strings or {}
+        self.offsets = {}
+        self.accessors = {} # A struct.Struct for each field alone, to read or write it without unpacking the record
+        self.indexes = {} # Where each field is in the unpacked tuple: an index, or a slice for multi-value fields
+
+        fmt = '<'
+        position = 0
+        index = 0
+        for field in fields:
+            field_name, code = field[0], field[1]
+            offset = field[2] if len(field) > 2 else position
+            if offset < position:
+                raise ValueError(f"{name}: field {field_name} at offset {offset} overlaps the previous field, which ends at {position}")
+            if offset > position:
+                fmt += f'{offset - position}x'
+            field_struct = struct.Struct('<' + code)
+            value_count = len(field_struct.unpack(bytes(field_struct.size)))
+            fmt += code
+            if field_name is not None:
+                self.offsets[field_name] = offset
+                self.accessors[field_name] = field_struct
+                self.indexes[field_name] = index if value_count == 1 else slice(index, index + value_count)
+            index += value_count
+            position = offset + field_struct.size
+
+        if size is not None:
+            if size < position:
+                raise ValueError(f"{name}: fields end at offset {position}, past the record's size of {size}")
+            if size > position:
+                fmt += f'{size - position}x'
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+        self.defaults = self.struct.unpack(bytes(self.size))
+
+    def __repr__(self):
+        return f"Layout({self.name}, {self.size} bytes)"
+
+    def unpackTuple(self, buffer, offset: int = 0) -> tuple:
+        return self.struct.unpack_from(buffer, offset)
+
+    def unpack(self, buffer, offset: int = 0) -> dict:
+        values = self.struct.unpack_from(buffer, offset)
+        return {name: values[index] for name, index in self.indexes.items()}
+
+    def iterUnpack(self, buffer):
+        return self.struct.iter_unpack(buffer)
+
+    def columns(self, buffer, count: int) -> dict:
+        # Unpacks count consecutive records at once, and returns one tuple of values per field
+        rows = list(zip(*self.struct.iter_unpack(memoryview(buffer)[:self.size * count]))) if count else [() for _ in self.defaults]
+        columns = {}
+        for name, index in self.indexes.items():
+            columns[name] = rows[index] if isinstance(index, int) else tuple(zip(*rows[index]))
+        return columns
+
+    def get(self, buffer, name: str, offset: int = 0):
+        values = self.accessors[name].unpack_from(buffer, offset + self.offsets[name])
+        return values[0] if len(values) == 1 else values
+
+    def set(self, buffer, name: str, value, offset: int = 0):
+        if isinstance(value, (tuple, list)):
+            self.accessors[name].pack_into(buffer, offset + self.offsets[name], *value)
+        else:
+            self.accessors[name].pack_into(buffer, offset + self.offsets[name], value)
+
+    def pack(self, **fields) -> bytes:
+        # Builds a whole record, fields which aren't given are zeroed
+        values = list(self.defaults)
+        for name, value in fields.items():
+            # An int index for a single value, a slice for repeated ones (e.g. '6H')
+            values[self.indexes[name]] = value
+        return self.struct.pack(*values)
+
+    def stringLength(self, name: str, header: dict = None) -> int:
+        length = self.strings[name][1]
+        return length(header) if callable(length) else length
+
+    def stringOffset(self, name: str) -> int:
+        return self.strings[name][0]
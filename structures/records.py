@@ -0,0 +1,87 @@
+# Compact record types for the data decoded from roms and saves.
+# They use __slots__ instead of a per-instance dict, which matters when holding the PC storage of thousands of saves,
+# but can still be used like the dicts they replace: record['name'], record.get('name'), 'name' in record, keys()...
+
+class Record:
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return isinstance(key, str) and key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if isinstance(key, str) else default
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def values(self):
+        return [getattr(self, key) for key in self.keys()]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) is type(other) and self.items() == other.items()
+        if isinstance(other, dict):
+            return self.asDict() == other
+        return NotImplemented
+
+    def asDict(self) -> dict:
+        return {key: value.asDict() if isinstance(value, Record) else value for key, value in self.items()}
+
+    def __repr__(self):
+        return repr(self.asDict())
+
+
+class Stats(Record):
+    __slots__ = ('hp', 'attack', 'defense', 'speed', 'spattack', 'spdefense')
+
+class Species(Record):
+    __slots__ = ('id', 'name', 'natDexNum', 'stats', 'types', 'abilities', 'category', 'genderRatio', 'growthRate', 'friendship')
+
+class Item(Record):
+    __slots__ = ('id', 'price', 'name')
+
+class Ability(Record):
+    __slots__ = ('id', 'name')
+
+class Move(Record):
+    __slots__ = ('id', 'effect', 'power', 'type', 'accuracy', 'pp', 'secondaryEffectChance', 'target', 'priority', 'category')
+
+class ItemSlot(Record):
+    __slots__ = ('id', 'name', 'quantity')
+
+class IVs(Record):
+    __slots__ = ('hp', 'attack', 'defence', 'speed', 'spatk', 'spdef', 'AbilityFlag')
+
+class Pokemon(Record):
+    __slots__ = (
+        'nickname', 'checksum', 'checksumValid', 'species', 'Level', 'exp', 'item', 'moves',
+        'EvHp', 'EvAtk', 'EvDef', 'EvSpe', 'EvSpA', 'EvSpD', 'Nature', 'Ivs', 'Ability', 'Gender',
+        'Stats', # Computed from the species' base stats, IVs, EVs, level and nature
+        # Ids and raw data, used to encode the pokemon back
+        'personality', 'otId', 'speciesId', 'itemId', 'moveIds', 'raw', 'substructs',
+    )
@@ -1,3 +1,5 @@
+from .layout import Layout
+
 offsets_dict = {
     "expansion": {
         "1.8.0": {
@@ -8,6 +10,15 @@ offsets_dict = {
             "team_count": [564, 568],
             "team_offset": 568,
             "gender": 8,
+            "pc_current_box": 0,
+            "pc_boxes_offset": 4,
+            "pc_box_count": 14,
+            "pc_box_size": 30,
+            "pc_box_names_offset": 33604,
+            "pc_box_wallpapers_offset": 33730,
+            # Used when the rom header doesn't tell them
+            "flags_size": 300,
+            "vars_count": 256,
         },
     },
 }
@@ -18,3 +29,64 @@ gamedata_dict = {
         "genders": ["boy", "girl"],
     },
 }
+
+# Each section holds up to 3968 bytes of data, followed by padding and its 12 bytes footer
+section_size = 4096
+section_data_size = 3968
+pc_sections = range(5, 14)
+# The amount of data stored in each section of vanilla emerald, in section ID order
+section_sizes = [3884, 3968, 3968, 3968, 3848, 3968, 3968, 3968, 3968, 3968, 3968, 3968, 3968, 2000]
+
+# Layouts of the pokemon structures stored in the save
+# https://bulbapedia.bulbagarden.net/wiki/Pok%C3%A9mon_data_structure_(Generation_III)
+box_pokemon_fields = [
+    ('personality', 'I',   0),
+    ('otId',        'I'),
+    ('nickname',    '10s'),
+    ('language',    'B'),
+    ('flags',       'B'), # isBadEgg, hasSpecies, isEgg
+    ('otName',      '7s'),
+    ('markings',    'B'),
+    ('checksum',    'H'),
+    (None,          'H'),
+    # Followed by the 48 bytes encrypted block holding the substructures
+]
+# A party pokemon is a box pokemon followed by its level and battle stats
+party_pokemon_fields = box_pokemon_fields + [
+    ('status',      'I',   80),
+    ('level',       'B'),
+    ('mail',        'B'),
+    ('hp',          'H'),
+    ('stats',       '6H'),
+]
+# The decrypted substructures, once put back in the G A E M order
+substructs_fields = [
+    # Growth
+    ('species',     'H',   0),
+    ('heldItem',    'H'),
+    ('experience',  'I'),
+    ('ppBonuses',   'B'),
+    ('friendship',  'B'),
+    # Attacks
+    ('moves',       '4H',  12),
+    ('pp',          '4B'),
+    # EVs & Condition
+    ('evs',         '6B'),
+    ('contest',     '6B'),
+    # Miscellaneous
+    ('pokerus',     'B'),
+    ('metLocation', 'B'),
+    ('origins',     'H'),
+    ('ivWord',      'I'),
+    ('ribbons',     'I'),
+]
+
+layouts_dict = {
+    "expansion": {
+        "1.8.0": {
+            "box_pokemon": Layout('BoxPokemon', box_pokemon_fields, size=80),
+            "pokemon": Layout('Pokemon', party_pokemon_fields, size=100),
+            "substructs": Layout('Substructs', substructs_fields, size=48),
+        },
+    },
+}